@@ -1,28 +1,73 @@
-import gymnasium as gym
 import torch
 import numpy as np
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
 import random
-from models import PolicyModel
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from models import PolicyModel, ActorCriticModel
+from inference import NumpyPolicy, export
+from rollout import RolloutPool
+from profiling import Timers, TrainingLog, ProfileWindow
+from metrics import RollingStats, MetricsWriter
+import checkpoint
+from checkpoint import Checkpointer, rng_state, set_rng_state
 import time
 
+def discounted_returns(rewards, gamma, block=128):
+    # reverse cumulative sum of gamma^k * r_k, done in blocks short enough that gamma^k doesn't underflow
+    rewards = np.asarray(rewards, dtype=np.float64)
+    if gamma == 0:
+        return rewards.copy()
+    if gamma < 1:
+        # gamma^k stays above 1e-300 for k < block; a block of 1 is the plain recurrence
+        block = max(1, min(block, int(-690 / math.log(gamma))))
+    returns = np.empty_like(rewards)
+    discounts = gamma ** np.arange(block, dtype=np.float64)
+    carry = 0.0
+    for end in range(len(rewards), 0, -block):
+        start = max(0, end - block)
+        d = discounts[:end - start]
+        returns[start:end] = np.cumsum((rewards[start:end] * d)[::-1])[::-1] / d + carry * gamma ** (end - start) / d
+        carry = returns[start]
+    return returns
+
 class REINFORCE:
-    def __init__(self, obs_dims, action_dims):
-        self.lr = 1e-3
-        self.gamma = 0.99
+    def __init__(self, obs_dims, action_dims, lean=False, normalise=False, numpy_inference=False, lr=1e-3, gamma=0.99, T_0=10, hidden_dims=(50, 50)):
+        self.lr = lr
+        self.gamma = gamma
         self.eps = 1e-8
+        # lean: keep only observations and actions during the rollout and recompute log-probs at update time
+        self.lean = lean
+        self.normalise = normalise
 
         self.probs = []
         self.rewards = []
+        self.states = []
+        self.actions = []
+        self.episodes = []
 
-        device = torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
-        self.net = PolicyModel().to(device)
+        self.device = torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
+        self.net = PolicyModel(hidden_dims=tuple(hidden_dims)).to(self.device)
         self.optimiser = torch.optim.Adam(self.net.parameters(), lr=self.lr, eps=self.eps)
-        self.scheduler = torch.optim.lr_scheduler.CosineAnnealingWarmRestarts(self.optimiser, T_0=10, eta_min=1e-4)
+        self.scheduler = torch.optim.lr_scheduler.CosineAnnealingWarmRestarts(self.optimiser, T_0=T_0, eta_min=min(1e-4, self.lr))
+
+        # numpy_inference samples lean-mode actions from a NumpyPolicy copy, refreshed after every update
+        self.policy = NumpyPolicy.from_state_dict(self.net.state_dict()) if numpy_inference else None
+        self.rng = np.random.default_rng(torch.initial_seed())
 
     def sample_action(self, state):
+        if self.lean:
+            state = np.asarray(state, dtype=np.float32)
+            if self.policy is not None:
+                action = self.policy.sample(state, self.rng)
+            else:
+                with torch.no_grad():
+                    probs = self.net(torch.from_numpy(state).to(self.device))
+                    action = torch.multinomial(probs, 1).item()
+            self.states.append(state)
+            self.actions.append(action)
+            return action-1
+
         state = torch.tensor(np.array([state], dtype=np.float32))
         probs = self.net(state)
 
@@ -30,21 +75,36 @@ class REINFORCE:
         action = dist.sample()
         prob = dist.log_prob(action)
 
-        action = action.numpy()
+        action = action.item()
 
         self.probs.append(prob)
 
         return action-1
 
-    def update(self):
-        running_g = 0
-        gs = []
+    def end_episode(self):
+        # lean mode only: close the current episode so several can go into one update
+        if self.states:
+            self.episodes.append((np.stack(self.states), np.array(self.actions, dtype=np.int64), np.array(self.rewards, dtype=np.float32), None))
+        self.states = []
+        self.actions = []
+        self.rewards = []
 
-        for R in self.rewards[::-1]:
-            running_g = R + self.gamma * running_g
-            gs.insert(0, running_g)
+    def _returns(self, episodes):
+        # rewards are the third field of each episode, whatever else it carries
+        gs = np.concatenate([discounted_returns(e[2], self.gamma) for e in episodes])
+        if self.normalise and len(gs) > 1:
+            gs = (gs - gs.mean()) / (gs.std() + self.eps)
+        return torch.tensor(gs, dtype=torch.float32, device=self.device)
 
-        deltas = torch.tensor(gs)
+    def update(self):
+        if self.lean:
+            self.end_episode()
+            if self.episodes:
+                self.update_batch(self.episodes)
+            self.episodes = []
+            return
+
+        deltas = self._returns([(None, None, self.rewards, None)])
         log_probs = torch.stack(self.probs).squeeze()
         loss = -torch.sum(log_probs * deltas)
 
@@ -56,61 +116,287 @@ class REINFORCE:
         self.probs = []
         self.rewards = []
 
-    def save_net(self, filepath):
+    def update_batch(self, episodes):
+        # episodes are (obs, actions, rewards, final obs) from RolloutPool.collect, actions as output indices
+        states = torch.from_numpy(np.concatenate([e[0] for e in episodes])).to(self.device)
+        actions = torch.from_numpy(np.concatenate([e[1] for e in episodes]).astype(np.int64)).to(self.device)
+        deltas = self._returns(episodes)
+
+        log_probs = torch.distributions.Categorical(self.net(states)).log_prob(actions)
+        loss = -torch.sum(log_probs * deltas)
+
+        self.optimiser.zero_grad()
+        loss.backward()
+        self.optimiser.step()
+        self.scheduler.step()
+        if self.policy is not None:
+            self.policy.load_state_dict(self.net.state_dict())
+
+    def state_dict(self):
+        return {
+            "net": self.net.state_dict(),
+            "optimiser": self.optimiser.state_dict(),
+            "scheduler": self.scheduler.state_dict(),
+            "rng": self.rng.bit_generator.state,
+        }
+
+    def load_state_dict(self, state):
+        self.net.load_state_dict(state["net"])
+        self.optimiser.load_state_dict(state["optimiser"])
+        self.scheduler.load_state_dict(state["scheduler"])
+        self.rng.bit_generator.state = state["rng"]
+        if self.policy is not None:
+            self.policy.load_state_dict(self.net.state_dict())
+
+    def save_net(self, filepath, export_dtype="float32"):
         torch.save(self.net.state_dict(), filepath)
         print(f"Saved PyTorch Model State to {filepath}")
+        # torch-free copy for pong.Agent / NumpyPolicy
+        export(self.net.state_dict(), os.path.splitext(filepath)[0] + ".npz", dtype=export_dtype)
+
+class PPO:
+    # clipped PPO with GAE over multi-episode batches; same update_batch/save_net interface as REINFORCE
+    def __init__(self, obs_dims, action_dims, lr=3e-4, gamma=0.99, gae_lambda=0.95, clip=0.2, epochs=4, minibatch_size=256,
+                 value_coef=0.5, entropy_coef=0.01, max_grad_norm=0.5, T_0=10, hidden_dims=(50, 50)):
+        self.lr = lr
+        self.gamma = gamma
+        self.gae_lambda = gae_lambda
+        self.clip = clip
+        self.epochs = epochs
+        self.minibatch_size = minibatch_size
+        self.value_coef = value_coef
+        self.entropy_coef = entropy_coef
+        self.max_grad_norm = max_grad_norm
+        self.eps = 1e-8
 
-def plot(data):
-    plt.rcParams["figure.figsize"] = (10, 5)
-    df1 = pd.DataFrame(data).melt()
-    df1.rename(columns={"variable": "episodes", "value": "reward"}, inplace=True)
-    sns.set_style("darkgrid")
-    sns.set_context("talk")
-    sns.set_palette("rainbow")
-    sns.lineplot(x="episodes", y="reward", data=df1).set(title="REINFORCE for Pong")
-    plt.show()
+        self.device = torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
+        self.net = ActorCriticModel(hidden_dims=tuple(hidden_dims)).to(self.device)
+        self.optimiser = torch.optim.Adam(self.net.parameters(), lr=self.lr, eps=self.eps)
+        self.scheduler = torch.optim.lr_scheduler.CosineAnnealingWarmRestarts(self.optimiser, T_0=T_0, eta_min=min(1e-4, self.lr))
+        self.rng = np.random.default_rng(torch.initial_seed())
 
-if __name__ == "__main__":
-    n_episodes = 5000
-    max_steps = 500
+    def _bootstrap(self, episodes):
+        # value of the observation each episode was truncated at, 0 for episodes that really ended
+        bootstrap = np.zeros(len(episodes), dtype=np.float64)
+        truncated = [i for i, e in enumerate(episodes) if e[3] is not None]
+        if truncated:
+            finals = torch.from_numpy(np.stack([episodes[i][3] for i in truncated])).to(self.device)
+            with torch.no_grad():
+                bootstrap[truncated] = self.net.forward_value(finals)[1].cpu().numpy()
+        return bootstrap
 
-    start = time.time()
-    gym.register(id="Pong-v0", entry_point="game:GameEnv", max_episode_steps=max_steps)
-    env = gym.make("Pong-v0")
-    wrapped_env = gym.wrappers.RecordEpisodeStatistics(env, buffer_length=n_episodes)
+    def _advantages(self, episodes, values, bootstrap):
+        advantages = np.empty(len(values), dtype=np.float64)
+        start = 0
+        for (_, _, rewards, _), last in zip(episodes, bootstrap):
+            end = start + len(rewards)
+            v = values[start:end]
+            next_v = np.append(v[1:], last)
+            deltas = rewards + self.gamma * next_v - v
+            advantages[start:end] = discounted_returns(deltas, self.gamma * self.gae_lambda)
+            start = end
+        return advantages, advantages + values
+
+    def update_batch(self, episodes):
+        states = torch.from_numpy(np.concatenate([e[0] for e in episodes])).to(self.device)
+        actions = torch.from_numpy(np.concatenate([e[1] for e in episodes]).astype(np.int64)).to(self.device)
+        with torch.no_grad():
+            probs, values = self.net.forward_value(states)
+            old_log_probs = torch.distributions.Categorical(probs).log_prob(actions)
+        advantages, returns = self._advantages(episodes, values.cpu().numpy().astype(np.float64), self._bootstrap(episodes))
+        advantages = (advantages - advantages.mean()) / (advantages.std() + self.eps)
+        advantages = torch.tensor(advantages, dtype=torch.float32, device=self.device)
+        returns = torch.tensor(returns, dtype=torch.float32, device=self.device)
+
+        n = len(actions)
+        for _ in range(self.epochs):
+            order = torch.from_numpy(self.rng.permutation(n)).to(self.device)
+            for start in range(0, n, self.minibatch_size):
+                idx = order[start:start + self.minibatch_size]
+                probs, values = self.net.forward_value(states[idx])
+                dist = torch.distributions.Categorical(probs)
+                ratio = torch.exp(dist.log_prob(actions[idx]) - old_log_probs[idx])
+                adv = advantages[idx]
+                policy_loss = -torch.min(ratio * adv, torch.clamp(ratio, 1 - self.clip, 1 + self.clip) * adv).mean()
+                value_loss = torch.nn.functional.mse_loss(values, returns[idx])
+                loss = policy_loss + self.value_coef * value_loss - self.entropy_coef * dist.entropy().mean()
+
+                self.optimiser.zero_grad()
+                loss.backward()
+                torch.nn.utils.clip_grad_norm_(self.net.parameters(), self.max_grad_norm)
+                self.optimiser.step()
+        self.scheduler.step()
+
+    def state_dict(self):
+        return {
+            "net": self.net.state_dict(),
+            "optimiser": self.optimiser.state_dict(),
+            "scheduler": self.scheduler.state_dict(),
+            "rng": self.rng.bit_generator.state,
+        }
+
+    def load_state_dict(self, state):
+        self.net.load_state_dict(state["net"])
+        self.optimiser.load_state_dict(state["optimiser"])
+        self.scheduler.load_state_dict(state["scheduler"])
+        self.rng.bit_generator.state = state["rng"]
+
+    def save_net(self, filepath, export_dtype="float32"):
+        # the .pth also holds the value head; the .npz export is the policy alone
+        torch.save(self.net.state_dict(), filepath)
+        print(f"Saved PyTorch Model State to {filepath}")
+        export(self.net.state_dict(), os.path.splitext(filepath)[0] + ".npz", dtype=export_dtype)
+
+LEARNERS = {"reinforce": REINFORCE, "ppo": PPO}
+
+def train(seed, n_episodes, max_steps, n_workers, batch_episodes, filepath, log_path=None, log_every=250, timed=True, profile=None, env_kwargs=None,
+          checkpoint_dir=None, checkpoint_every=250, keep_checkpoints=3, resume=False, metrics_path=None, agent_kwargs=None, algo="reinforce"):
+    # profile: optional (kind, start_episode, n_episodes) capture window, kind "cprofile" or "torch"
+    # env_kwargs go to GameEnv, e.g. {"frame_skip": 4}; max_steps counts policy decisions
+    # algo is a key of LEARNERS; agent_kwargs go to its class, e.g. {"lr": 3e-4, "hidden_dims": (64, 64)}
+    # resume continues from the newest checkpoint in checkpoint_dir, if there is one
+    # metrics_path gets one CSV row per episode, for `python metrics.py plot`
+    torch.manual_seed(seed)
+    random.seed(seed)
+    np.random.seed(seed)
 
     obs_dims = 6 # env.observation_space.shape[0]
     action_dims = 3 # env.action_space.shape[0]
-    rewards_over_seeds = []
+    agent = LEARNERS[algo](obs_dims, action_dims, **(agent_kwargs or {}))
+    stats = RollingStats(window=log_every)
+    metrics_offset = None
+    timers = Timers(enabled=timed)
+    log = TrainingLog(log_path)
+    window = ProfileWindow(*profile) if profile is not None else None
+    checkpointer = Checkpointer(checkpoint_dir, keep_checkpoints) if checkpoint_dir is not None else None
+
+    with RolloutPool(n_workers, max_steps, seed=seed, env_kwargs=env_kwargs, timers=timers) as pool:
+        episode = 0
+        if resume and checkpointer is not None and checkpointer.latest() is not None:
+            state = checkpoint.load(checkpointer.latest())
+            agent.load_state_dict(state["agent"])
+            set_rng_state(state["rng"])
+            pool.set_rng_states(state["workers"])
+            episode = state["episode"]
+            stats = state["stats"]
+            metrics_offset = state["metrics_offset"]
+            print(f"Resumed seed {seed} from episode {episode}")
+        metrics = MetricsWriter(metrics_path, truncate_at=metrics_offset) if metrics_path is not None else None
+        next_log = episode
+        next_checkpoint = episode + checkpoint_every
+        while episode < n_episodes:
+            if window is not None:
+                window.on_episode(episode)
+            with timers.phase("set_weights"):
+                pool.set_weights(agent.net.state_dict())
+            n = min(batch_episodes, n_episodes - episode)
+            with timers.phase("collect"):
+                episodes = pool.collect(n, seed=seed)
+            with timers.phase("update"):
+                agent.update_batch(episodes)
 
-    for seed in [3]:
-        torch.manual_seed(seed)
-        random.seed(seed)
-        np.random.seed(seed)
+            for _, actions, rewards, _ in episodes:
+                ret = float(np.sum(rewards))
+                stats.add(ret)
+                if metrics is not None:
+                    metrics.write(episode, ret, len(actions))
+                timers.count("episodes")
+                timers.count("steps", len(actions))
+                episode += 1
 
-        agent = REINFORCE(obs_dims, action_dims)
-        reward_over_episodes = []
+            if episode > next_log or episode == n_episodes:
+                next_log += log_every
+                timing = timers.snapshot()
+                counters = timing["counters"]
+                summary = stats.summary()
+                log.write({
+                    "seed": seed,
+                    "episode": episode,
+                    "avg_reward": summary["overall_mean"],
+                    "rolling_reward": summary["mean"],
+                    "rolling_std": summary["std"],
+                    "p10": summary["p10"],
+                    "p50": summary["p50"],
+                    "p90": summary["p90"],
+                    "episode_length": counters.get("steps", 0) / max(1, counters.get("episodes", 0)),
+                    "steps_per_sec": counters.get("steps", 0) / timing["wall"],
+                    "lr": agent.scheduler.get_last_lr()[0],
+                    "phases": timing["phases"],
+                })
 
-        for episode in range(n_episodes):
-            obs, info = wrapped_env.reset(seed=seed)
+            if checkpointer is not None and (episode >= next_checkpoint or episode == n_episodes):
+                next_checkpoint = episode + checkpoint_every
+                with timers.phase("checkpoint"):
+                    checkpointer.save({
+                        "episode": episode,
+                        "agent": agent.state_dict(),
+                        "rng": rng_state(),
+                        "workers": pool.get_rng_states(),
+                        "stats": stats,
+                        "metrics_offset": metrics.tell() if metrics is not None else None,
+                    }, episode)
 
-            done = False
-            while not done:
-                action = agent.sample_action(obs)
+        if metrics is not None:
+            metrics.close()
 
-                obs, reward, terminated, truncated, info = wrapped_env.step(action)
-                agent.rewards.append(reward)
+    if window is not None:
+        window.close()
+    with timers.phase("checkpoint"):
+        if checkpointer is not None:
+            checkpointer.close()
+        agent.save_net(filepath)
+    log.write({"seed": seed, "episode": episode, "phases": timers.snapshot()["phases"]})
+    log.close()
+    return stats.summary()
 
-                done = terminated or truncated
+def train_seeds(seeds, n_episodes=5000, max_steps=500, batch_episodes=8, model_path="../models/r50_redrew.pth", log_dir="../logs",
+                checkpoint_dir="../checkpoints", resume=False, n_workers=None, env_kwargs=None, algo="reinforce"):
+    # trains each seed in its own process, splitting the cores between them; batch_episodes=1 reproduces per-episode updates
+    start = time.time()
+    if n_workers is None:
+        n_workers = max(1, ((os.cpu_count() or 2) - 1) // len(seeds))
+    if len(seeds) == 1:
+        paths = [model_path]
+    else:
+        stem, ext = os.path.splitext(model_path)
+        paths = [f"{stem}_s{seed}{ext}" for seed in seeds]
+    args = [(seed, n_episodes, max_steps, n_workers, batch_episodes, path, os.path.join(log_dir, f"train_s{seed}.jsonl")) for seed, path in zip(seeds, paths)]
+    kwargs = [{"checkpoint_dir": os.path.join(checkpoint_dir, f"s{seed}"), "resume": resume, "metrics_path": os.path.join(log_dir, f"metrics_s{seed}.csv"), "env_kwargs": env_kwargs, "algo": algo} for seed in seeds]
 
-            reward_over_episodes.append(wrapped_env.return_queue[-1])
-            agent.update()
+    if len(seeds) == 1:
+        summaries = [train(*args[0], **kwargs[0])]
+    else:
+        with ProcessPoolExecutor(len(seeds)) as executor:
+            futures = [executor.submit(train, *a, **kw) for a, kw in zip(args, kwargs)]
+            summaries = [f.result() for f in futures]
+    for seed, summary in zip(seeds, summaries):
+        print(f"Seed {seed}: average reward {summary['overall_mean']:.2f}, rolling {summary['mean']:.2f}")
+    print("Plot with: python metrics.py plot " + " ".join(kw["metrics_path"] for kw in kwargs))
+    print(f"Completed in {(time.time()-start)/60:.2f}mins")
+    return summaries
 
-            if episode % 250 == 0:
-                avg_reward = int(np.mean(wrapped_env.return_queue))
-                print("Episode:", episode, "Average Reward:", avg_reward)
+def test_learners(steps=20):
+    # one update of every learner and mode on a short random episode, e.g. after changing the episode layout
+    rng = np.random.default_rng(0)
+    obs = rng.normal(size=(steps, 6)).astype(np.float32)
+    rewards = rng.normal(size=steps).astype(np.float32)
+    for name, agent in (("reinforce", REINFORCE(6, 3)), ("reinforce lean", REINFORCE(6, 3, lean=True)),
+                        ("reinforce lean numpy", REINFORCE(6, 3, lean=True, numpy_inference=True))):
+        for o, r in zip(obs, rewards):
+            agent.sample_action(o)
+            agent.rewards.append(float(r))
+        agent.update()
+        print(f"{name}: update ok")
+    actions = rng.integers(0, 3, steps)
+    for final in (None, obs[-1]):
+        for name, agent in (("reinforce batch", REINFORCE(6, 3, lean=True)), ("ppo", PPO(6, 3))):
+            agent.update_batch([(obs, actions, rewards, final)])
+            print(f"{name} ({'truncated' if final is not None else 'terminal'}): update_batch ok")
 
-        rewards_over_seeds.append(reward_over_episodes)
-        agent.save_net("../models/r50_redrew.pth")
-    plot(rewards_over_seeds)
-    print(f"Completed in {(time.time()-start)/60:.2f}mins")
\ No newline at end of file
+if __name__ == "__main__":
+    import sys
+    if sys.argv[1:] == ["test"]:
+        test_learners()
+        sys.exit(0)
+    import cli
+    sys.exit(cli.main(["train", *sys.argv[1:]]))
@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import numpy as np
+
+"""
+Micro and macro benchmarks for the env, the policy and the game loop.
+
+    python bench.py --out bench.json
+    python bench.py --compare bench.json --threshold 0.1
+
+Each benchmark reports seconds per operation over several repeats; --compare
+flags any whose median got slower than the baseline by more than --threshold.
+"""
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+def _time(fn, ops, repeats):
+    # fn runs `ops` operations per call; returns seconds per operation for each repeat
+    fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) / ops)
+    return times
+
+def _make_env():
+    from game import GameEnv
+    env = GameEnv()
+    env.reset(seed=0)
+    return env
+
+@benchmark("env.step")
+def bench_env_step(repeats):
+    env = _make_env()
+    n = 2000
+    def run():
+        for _ in range(n):
+            if env.step(0)[2]:
+                env.reset()
+    return _time(run, n, repeats)
+
+@benchmark("env.reset")
+def bench_env_reset(repeats):
+    env = _make_env()
+    n = 2000
+    def run():
+        for i in range(n):
+            env.reset(seed=i)
+    return _time(run, n, repeats)
+
+@benchmark("env.snapshot")
+def bench_env_snapshot(repeats):
+    # one get_state() plus one set_state()
+    env = _make_env()
+    n = 2000
+    def run():
+        for _ in range(n):
+            env.set_state(env.get_state())
+    return _time(run, n, repeats)
+
+@benchmark("planner.act")
+def bench_planner_act(repeats):
+    from planner import MonteCarloPlanner
+    env = _make_env()
+    planner = MonteCarloPlanner(rollouts=16, horizon=30)
+    state = env.get_state()
+    n = 20
+    def run():
+        for _ in range(n):
+            planner.act(state)
+    return _time(run, n, repeats)
+
+def _bench_vector_env_step(repeats, swept):
+    from vector_env import VectorPongEnv
+    env = VectorPongEnv(1024, max_episode_steps=500, swept=swept)
+    env.reset(seed=0)
+    actions = np.zeros(1024, dtype=np.int64)
+    n = 100
+    def run():
+        for _ in range(n):
+            env.step(actions)
+    return _time(run, n * env.num_envs, repeats)
+
+# the discrete collision test, as this benchmark has always measured; the swept default is tracked separately
+@benchmark("vector_env.step_per_game")
+def bench_vector_env_step(repeats):
+    return _bench_vector_env_step(repeats, swept=False)
+
+@benchmark("vector_env.step_per_game_swept")
+def bench_vector_env_step_swept(repeats):
+    return _bench_vector_env_step(repeats, swept=True)
+
+@benchmark("reinforce.sample_action")
+def bench_sample_action(repeats):
+    import torch
+    from agent import REINFORCE
+    torch.manual_seed(0)
+    agent = REINFORCE(6, 3)
+    obs = _make_env()._get_obs()
+    n = 1000
+    def run():
+        for _ in range(n):
+            agent.sample_action(obs)
+        agent.probs = []
+    return _time(run, n, repeats)
+
+@benchmark("reinforce.sample_action_lean_numpy")
+def bench_sample_action_numpy(repeats):
+    import torch
+    from agent import REINFORCE
+    torch.manual_seed(0)
+    agent = REINFORCE(6, 3, lean=True, numpy_inference=True)
+    obs = _make_env()._get_obs()
+    n = 1000
+    def run():
+        for _ in range(n):
+            agent.sample_action(obs)
+        agent.states = []
+        agent.actions = []
+    return _time(run, n, repeats)
+
+def _bench_update(repeats, length):
+    import torch
+    from agent import REINFORCE
+    torch.manual_seed(0)
+    agent = REINFORCE(6, 3)
+    obs = _make_env()._get_obs()
+    def run():
+        for _ in range(length):
+            agent.sample_action(obs)
+            agent.rewards.append(0.1)
+        agent.update()
+    # includes the rollout's sample_action calls, which build the graph update() backpropagates through
+    return _time(run, 1, repeats)
+
+for _length in (50, 200, 500):
+    benchmark(f"reinforce.update[{_length}]")(lambda repeats, length=_length: _bench_update(repeats, length))
+
+def _make_game():
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    from pong import Game
+    game = Game(seed=0)
+    game.waiting = False
+    return game
+
+@benchmark("game.update")
+def bench_game_update(repeats):
+    game = _make_game()
+    n = 2000
+    def run():
+        for _ in range(n):
+            game.update(1 / game.fps)
+    return _time(run, n, repeats)
+
+@benchmark("game.draw")
+def bench_game_draw(repeats):
+    # a frame of play: one update so the ball and paddles move, then the draw
+    game = _make_game()
+    n = 200
+    def run():
+        for _ in range(n):
+            game.update(1 / game.fps)
+            game.draw()
+    return _time(run, n, repeats)
+
+@benchmark("train.episode")
+def bench_train_episode(repeats):
+    import torch
+    from agent import REINFORCE
+    torch.manual_seed(0)
+    env = _make_env()
+    agent = REINFORCE(6, 3)
+    n = 5
+    def run():
+        for _ in range(n):
+            obs, info = env.reset(seed=3)
+            for _ in range(500):
+                obs, reward, terminated, truncated, info = env.step(agent.sample_action(obs))
+                agent.rewards.append(reward)
+                if terminated:
+                    break
+            agent.update()
+    return _time(run, n, repeats)
+
+def run_benchmarks(names, repeats):
+    results = {}
+    for name in names:
+        times = BENCHMARKS[name](repeats)
+        results[name] = {
+            "median": statistics.median(times),
+            "min": min(times),
+            "mean": statistics.fmean(times),
+            "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+            "repeats": len(times),
+        }
+        print(f"{name:40s} {_fmt(results[name]['median']):>10s}/op  (min {_fmt(results[name]['min'])})")
+    return results
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["median"] / baseline[name]["median"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = "faster"
+        print(f"{name:40s} {_fmt(baseline[name]['median']):>10s} -> {_fmt(result['median']):>10s}  x{ratio:.2f} {flag}")
+    return regressions
+
+def _fmt(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pong performance benchmarks")
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown counted as a regression")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--only", nargs="*", help="benchmark names or prefixes to run")
+    args = parser.parse_args(argv)
+
+    names = list(BENCHMARKS)
+    if args.only:
+        names = [n for n in names if any(n.startswith(p) for p in args.only)]
+
+    results = run_benchmarks(names, args.repeats)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"python": sys.version.split()[0], "machine": platform.machine(), "numpy": np.__version__, "results": results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        print()
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import copy
+import glob
+import os
+import queue
+import random
+import threading
+import numpy as np
+import torch
+
+"""
+Background checkpoint writer. save() takes a CPU copy of the state on the
+calling thread, then a worker thread serialises it to a temporary file and
+renames it into place, so a crash mid-write never leaves a truncated
+checkpoint. Only the newest `keep` checkpoints are kept.
+"""
+
+class Checkpointer:
+    def __init__(self, directory, keep=3):
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+        self.queue = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def path(self, episode):
+        return os.path.join(self.directory, f"checkpoint_{episode:08d}.pt")
+
+    def save(self, state, episode):
+        if self.error is not None:
+            raise RuntimeError("Previous checkpoint failed to save") from self.error
+        self.queue.put((_snapshot(state), self.path(episode)))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                state, path = item
+                tmp = path + ".tmp"
+                torch.save(state, tmp)
+                os.replace(tmp, path)
+                for old in self.checkpoints()[:-self.keep]:
+                    os.remove(old)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def checkpoints(self):
+        return sorted(glob.glob(os.path.join(self.directory, "checkpoint_*.pt")))
+
+    def latest(self):
+        checkpoints = self.checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    def wait(self):
+        self.queue.join()
+        if self.error is not None:
+            raise RuntimeError("Checkpoint failed to save") from self.error
+
+    def close(self):
+        self.wait()
+        self.queue.put(None)
+        self.thread.join()
+
+def load(path):
+    # checkpoints hold RNG and optimiser state as well as tensors, so they can't use weights_only
+    return torch.load(path, map_location="cpu", weights_only=False)
+
+def _snapshot(state):
+    if isinstance(state, torch.Tensor):
+        return state.detach().to("cpu", copy=True)
+    if isinstance(state, dict):
+        return {k: _snapshot(v) for k, v in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(_snapshot(v) for v in state)
+    return copy.deepcopy(state)
+
+def rng_state():
+    return {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+        "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+    }
+
+def set_rng_state(state):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if state["cuda"] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
@@ -0,0 +1,185 @@
+import argparse
+import json
+import sys
+
+"""
+Single entry point for training, playing, evaluating, serving and benchmarking.
+
+    python cli.py train --seeds 3 4 --episodes 5000
+    python cli.py play --model ../models/r50_redrew.npz
+    python cli.py eval --model ../models/a.npz ../models/b.npz --head-to-head
+    python cli.py sweep --space space.json --dir ../sweeps/lr
+    python cli.py match --left tracker --right ../models/r50_redrew.npz --matches 200
+    python cli.py serve --model ../models/r50_redrew.npz --address /tmp/pong.sock --watch 5
+    python cli.py bench --only env
+    python cli.py train --config runs/long.toml
+
+Each subcommand imports only what it uses, so play and eval with an .npz
+model never load torch. --config reads a TOML or JSON file; top-level keys
+and keys under a table named after the subcommand become defaults, and
+options given on the command line still win.
+"""
+
+def _load_config(path, command):
+    if path.endswith(".json"):
+        with open(path) as f:
+            config = json.load(f)
+    else:
+        import tomllib
+        with open(path, "rb") as f:
+            config = tomllib.load(f)
+    values = {k.replace("-", "_"): v for k, v in config.items() if not isinstance(v, dict)}
+    values.update({k.replace("-", "_"): v for k, v in config.get(command, {}).items()})
+    return values
+
+def cmd_train(args):
+    from agent import train_seeds
+    env_kwargs = {"frame_skip": args.frame_skip} if args.frame_skip != 1 else None
+    train_seeds(args.seeds, args.episodes, args.max_steps, args.batch_episodes, args.model, args.log_dir,
+                args.checkpoint_dir, args.resume, args.workers, env_kwargs, args.algo)
+    return 0
+
+def cmd_play(args):
+    from pong import Game
+    game = Game(fps=args.fps, max_score=args.max_score, render_fps=args.render_fps)
+    if args.server:
+        game.connect_agent(args.server, args.frame_skip)
+    elif args.model:
+        game.load_agent(args.model, args.frame_skip)
+    game.run()
+    return 0
+
+def cmd_eval(args):
+    from evaluate import Evaluator, report
+    # a single model given as a config value is a plain string
+    models = [args.model] if isinstance(args.model, str) else args.model
+    evaluator = Evaluator(args.episodes, args.seed, args.max_steps, args.cache, args.workers, args.frame_skip)
+    results = evaluator.evaluate(models)
+    matrix = evaluator.head_to_head(models) if args.head_to_head and len(models) > 1 else None
+    report(results, matrix, models)
+    return 0
+
+def cmd_sweep(args):
+    from sweep import Sweep
+    space = None
+    if args.space:
+        with open(args.space) as f:
+            space = json.load(f)
+    sweep = Sweep(args.dir, space, args.trials, args.min_episodes, args.max_episodes, args.eta, args.workers,
+                  args.seed, args.max_steps, args.batch_episodes)
+    for trial, score, config in sweep.run()[:args.top]:
+        print(f"trial {trial:3d}  rolling return {score:8.3f}  {config}")
+    return 0
+
+def cmd_match(args):
+    from match import Recorder, load_controller, report, run_matches
+    left = load_controller(args.left, args.frame_skip, args.seed)
+    right = load_controller(args.right, args.frame_skip, args.seed + 1)
+    if args.record:
+        left, right = Recorder(left), Recorder(right)
+    stats = run_matches(left, right, args.matches, args.seed, args.dt, args.max_score)
+    report(stats, args.left, args.right)
+    if args.record:
+        left.save(args.record + "_left.npy")
+        right.save(args.record + "_right.npy")
+    return 0
+
+def cmd_serve(args):
+    from serve import PolicyServer
+    PolicyServer(args.model, args.address, args.max_batch, args.max_wait / 1000, args.watch).run()
+    return 0
+
+def cmd_bench(args):
+    import bench
+    return bench.main(args.bench_args)
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="AI-Pong")
+    parser.add_argument("--config", help="TOML or JSON file of option defaults")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train = sub.add_parser("train", help="train REINFORCE or PPO agents")
+    train.add_argument("--algo", choices=["reinforce", "ppo"], default="reinforce")
+    train.add_argument("--seeds", type=int, nargs="+", default=[3])
+    train.add_argument("--episodes", type=int, default=5000)
+    train.add_argument("--max-steps", type=int, default=500)
+    train.add_argument("--batch-episodes", type=int, default=8, help="episodes per gradient step")
+    train.add_argument("--workers", type=int, help="rollout workers per seed (default: spread over the cores)")
+    train.add_argument("--frame-skip", type=int, default=1)
+    train.add_argument("--model", default="../models/r50_redrew.pth")
+    train.add_argument("--log-dir", default="../logs")
+    train.add_argument("--checkpoint-dir", default="../checkpoints")
+    train.add_argument("--resume", action="store_true", help="continue from the latest checkpoints")
+    train.set_defaults(func=cmd_train)
+
+    play = sub.add_parser("play", help="play against a trained agent")
+    play.add_argument("--model", default="../models/r50_redrew.npz", help="use an empty string for two human players")
+    play.add_argument("--fps", type=int, default=60)
+    play.add_argument("--render-fps", type=float, help="redraw at most this often (default: every update at --fps)")
+    play.add_argument("--max-score", type=int, default=5)
+    play.add_argument("--frame-skip", type=int, default=1)
+    play.add_argument("--server", help="get the agent's moves from a policy server at this address instead of --model")
+    play.set_defaults(func=cmd_play)
+
+    evaluate = sub.add_parser("eval", help="score models over seeded episodes")
+    evaluate.add_argument("--model", nargs="+", default=["../models/r50_redrew.npz"])
+    evaluate.add_argument("--episodes", type=int, default=2000)
+    evaluate.add_argument("--max-steps", type=int, default=500)
+    evaluate.add_argument("--frame-skip", type=int, default=1, help="physics ticks per decision, as the model was trained with")
+    evaluate.add_argument("--seed", type=int, default=0)
+    evaluate.add_argument("--head-to-head", action="store_true", help="also play every pair of models against each other")
+    evaluate.add_argument("--cache", default="../models/eval_cache.json", help="results cache keyed by model hash")
+    evaluate.add_argument("--workers", type=int, default=1, help="processes to spread models over")
+    evaluate.set_defaults(func=cmd_eval)
+
+    sweep = sub.add_parser("sweep", help="hyperparameter sweep with successive halving")
+    sweep.add_argument("--space", help="JSON search space (only needed to start a new sweep)")
+    sweep.add_argument("--dir", default="../sweeps/default", help="sweep directory; rerun with the same one to resume")
+    sweep.add_argument("--trials", type=int, default=27)
+    sweep.add_argument("--min-episodes", type=int, default=100)
+    sweep.add_argument("--max-episodes", type=int, default=2700)
+    sweep.add_argument("--eta", type=int, default=3, help="keep the best 1/eta trials at each rung")
+    sweep.add_argument("--workers", type=int, help="concurrent trials (default: one per core)")
+    sweep.add_argument("--seed", type=int, default=0)
+    sweep.add_argument("--max-steps", type=int, default=500)
+    sweep.add_argument("--batch-episodes", type=int, default=8)
+    sweep.add_argument("--top", type=int, default=5, help="number of final trials to print")
+    sweep.set_defaults(func=cmd_sweep)
+
+    match = sub.add_parser("match", help="play full games headless at machine speed")
+    match.add_argument("--left", default="tracker", help="tracker, a model path, or replay:<file.npy>")
+    match.add_argument("--right", default="../models/r50_redrew.npz", help="tracker, a model path, or replay:<file.npy>")
+    match.add_argument("--matches", type=int, default=100)
+    match.add_argument("--max-score", type=int, default=5)
+    match.add_argument("--dt", type=float, default=1 / 60, help="seconds of game time per tick")
+    match.add_argument("--seed", type=int, default=0)
+    match.add_argument("--frame-skip", type=int, default=1)
+    match.add_argument("--record", help="save each side's moves to <record>_left.npy and <record>_right.npy for replay")
+    match.set_defaults(func=cmd_match)
+
+    serve = sub.add_parser("serve", help="serve a model to many games with batched inference")
+    serve.add_argument("--model", default="../models/r50_redrew.npz")
+    serve.add_argument("--address", default="/tmp/ai-pong.sock", help="Unix socket path or host:port")
+    serve.add_argument("--max-batch", type=int, default=256)
+    serve.add_argument("--max-wait", type=float, default=2.0, help="milliseconds to wait for a batch to fill")
+    serve.add_argument("--watch", type=float, help="reload the model when the file changes, checking every this many seconds")
+    serve.set_defaults(func=cmd_serve)
+
+    bench = sub.add_parser("bench", help="run the benchmark suite (options are passed to bench.py)", add_help=False)
+    bench.set_defaults(func=cmd_bench)
+    return parser, {"train": train, "play": play, "eval": evaluate, "sweep": sweep, "match": match, "serve": serve, "bench": bench}
+
+def main(argv=None):
+    parser, commands = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if args.config:
+        commands[args.command].set_defaults(**_load_config(args.config, args.command))
+        args, extra = parser.parse_known_args(argv)
+    if args.command == "bench":
+        args.bench_args = extra
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from inference import NumpyPolicy
+from vector_env import VectorPongEnv
+
+"""
+Batched evaluation of saved policies. Every episode gets its own game in a
+VectorPongEnv seeded once, so all checkpoints are scored on the same set of
+starting positions and each game is counted exactly once (no bias towards
+short episodes). Results are cached by checkpoint content hash and settings.
+"""
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+def wilson_interval(wins, n, z=1.96):
+    if n == 0:
+        return (0.0, 1.0)
+    p = wins / n
+    centre = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return (centre - half, centre + half)
+
+def play_episodes(policy, episodes, seed=0, max_steps=500, opponent=None, frame_skip=1):
+    # policy plays the right paddle; opponent (a NumpyPolicy) the left one, or the scripted tracker if None.
+    # As in GameEnv(frame_skip=k), each decision is repeated for k ticks and max_steps counts decisions.
+    env = VectorPongEnv(episodes, max_episode_steps=max_steps * frame_skip)
+    obs, info = env.reset(seed=seed)
+    rng = np.random.default_rng(seed)
+
+    live = np.ones(episodes, dtype=bool)
+    returns = np.zeros(episodes, dtype=np.float64)
+    hits = np.zeros(episodes, dtype=np.int64)
+    lengths = np.zeros(episodes, dtype=np.int64)
+    scores = np.full(episodes, -1, dtype=np.int8)
+
+    while live.any():
+        if opponent is not None:
+            env.opponent_actions = opponent.sample_batch(env.opponent_obs(), rng) - 1
+        actions = policy.sample_batch(obs, rng) - 1
+        lengths[live] += 1
+        for _ in range(frame_skip):
+            obs, rewards, terminated, truncated, info = env.step(actions)
+            returns[live] += rewards[live]
+            hits[live] += info["hit"][live] != -1
+            done = live & (terminated | truncated)
+            scores[done] = info["score"][done]
+            live &= ~done
+
+    return returns, hits, lengths, scores
+
+def summarise(returns, hits, lengths, scores):
+    n = len(returns)
+    wins = int(np.sum(scores == 1))
+    losses = int(np.sum(scores == 0))
+    half = 1.96 * returns.std(ddof=1) / math.sqrt(n) if n > 1 else 0.0
+    return {
+        "episodes": n,
+        "win_rate": wins / n,
+        "win_rate_ci": wilson_interval(wins, n),
+        "loss_rate": losses / n,
+        "mean_return": float(returns.mean()),
+        "mean_return_ci": (float(returns.mean() - half), float(returns.mean() + half)),
+        "mean_rally": float(hits.mean()),
+        "mean_length": float(lengths.mean()),
+    }
+
+def _evaluate_one(path, episodes, seed, max_steps, opponent_path=None, frame_skip=1):
+    policy = NumpyPolicy.load(path)
+    opponent = NumpyPolicy.load(opponent_path) if opponent_path is not None else None
+    return summarise(*play_episodes(policy, episodes, seed, max_steps, opponent, frame_skip))
+
+class Evaluator:
+    def __init__(self, episodes=2000, seed=0, max_steps=500, cache_path=None, workers=1, frame_skip=1):
+        self.episodes = episodes
+        self.seed = seed
+        self.max_steps = max_steps
+        self.frame_skip = frame_skip
+        self.cache_path = cache_path
+        self.workers = workers
+        self.cache = {}
+        if cache_path is not None and os.path.exists(cache_path):
+            with open(cache_path) as f:
+                self.cache = json.load(f)
+
+    def _key(self, *hashes):
+        return ":".join(hashes) + f"@{self.episodes},{self.seed},{self.max_steps},{self.frame_skip}"
+
+    def _run(self, jobs):
+        # jobs: {cache key: (path, opponent path or None)}; only uncached keys are played
+        todo = {key: job for key, job in jobs.items() if key not in self.cache}
+        if todo:
+            args = [(path, self.episodes, self.seed, self.max_steps, opponent, self.frame_skip) for path, opponent in todo.values()]
+            if self.workers > 1 and len(todo) > 1:
+                with ProcessPoolExecutor(min(self.workers, len(todo))) as executor:
+                    results = list(executor.map(_evaluate_one, *zip(*args)))
+            else:
+                results = [_evaluate_one(*a) for a in args]
+            self.cache.update(zip(todo, results))
+            self._save()
+        return {key: self.cache[key] for key in jobs}
+
+    def _save(self):
+        if self.cache_path is None:
+            return
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp = self.cache_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.cache, f, indent=1)
+        os.replace(tmp, self.cache_path)
+
+    def evaluate(self, paths):
+        # each checkpoint against the scripted opponent
+        hashes = [file_hash(p) for p in paths]
+        results = self._run({self._key(h): (p, None) for p, h in zip(paths, hashes)})
+        return {p: results[self._key(h)] for p, h in zip(paths, hashes)}
+
+    def head_to_head(self, paths):
+        # matrix[i][j]: win rate of paths[i] on the right paddle against paths[j] on the left
+        hashes = [file_hash(p) for p in paths]
+        jobs = {}
+        for i, (p, h) in enumerate(zip(paths, hashes)):
+            for j, (q, g) in enumerate(zip(paths, hashes)):
+                if i != j:
+                    jobs[self._key(h, g)] = (p, q)
+        results = self._run(jobs)
+        matrix = np.full((len(paths), len(paths)), np.nan)
+        for i, h in enumerate(hashes):
+            for j, g in enumerate(hashes):
+                if i != j:
+                    matrix[i, j] = results[self._key(h, g)]["win_rate"]
+        return matrix
+
+def report(results, matrix=None, paths=None):
+    for path, r in results.items():
+        lo, hi = r["win_rate_ci"]
+        rlo, rhi = r["mean_return_ci"]
+        print(f"{os.path.basename(path):30s} win {r['win_rate']:.3f} [{lo:.3f}, {hi:.3f}]  return {r['mean_return']:.2f} [{rlo:.2f}, {rhi:.2f}]  rally {r['mean_rally']:.2f}  length {r['mean_length']:.1f}")
+    if matrix is not None:
+        names = [os.path.basename(p)[:12] for p in paths]
+        print("\nhead-to-head win rate (row on the right vs column on the left)")
+        print(" " * 14 + "".join(f"{n:>14s}" for n in names))
+        for name, row in zip(names, matrix):
+            print(f"{name:>14s}" + "".join(f"{'-' if np.isnan(v) else f'{v:.3f}':>14s}" for v in row))
@@ -1,7 +1,7 @@
 import gymnasium as gym
 import numpy as np
-import pygame
 from gymnasium.utils.env_checker import check_env
+from physics import Paddle, Physics, LEFT_X, RIGHT_X
 
 """
 Reward system:
@@ -9,8 +9,16 @@ Reward system:
     Scoring      = +10 (-10 for conceding)
 """
 
+# fixed-size snapshot of a game, see GameEnv.get_state(); VectorPongEnv uses the same layout per game, minus the RNG
+STATE_DTYPE = np.dtype([("agent_y", np.float64), ("agent_vy", np.float64), ("opp_y", np.float64), ("opp_vy", np.float64),
+                        ("ball_pos", np.float64, (2,)), ("ball_vel", np.float64, (2,)), ("reward", np.float64),
+                        ("rng", np.uint64, (6,))])
+_LOW64 = (1 << 64) - 1
+
 class GameEnv(gym.Env):
-    def __init__(self, init_speed=600, max_speed=3000, friction=1, restitution=15):
+    metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 60}
+
+    def __init__(self, init_speed=600, max_speed=3000, friction=1, restitution=15, render_mode=None, render_scale=1.0, dt=0.016, frame_skip=1, swept=True):
         self.width = 1280
         self.height = 720
         self.pad_width = self.width * 0.04
@@ -20,158 +28,183 @@ class GameEnv(gym.Env):
         self.max_speed = max_speed
         self.friction = friction
         self.restitution = restitution
-
-        self.agent = np.array([self.width * 0.9, 0], dtype=np.float32)
-        self.agent_vy = 0
-        self.opp = np.array([self.width * 0.1 - self.pad_width, 0], dtype=np.float32)
-        self.opp_vy = 0
-        self.ball_pos = np.array([0, 0], dtype=np.float32)
-        self.ball_vel = np.array([0, 0], dtype=np.float32)
+        # each step repeats the action for frame_skip physics ticks of dt seconds
+        self.dt = dt
+        self.frame_skip = frame_skip
+        # a direction for the left paddle to take instead of tracking the ball, e.g. from planner.MonteCarloPlanner
+        self.opponent_action = None
+
+        self.agent = Paddle(RIGHT_X, 0, self.pad_width, self.pad_height, init_speed)
+        self.opp = Paddle(LEFT_X, 0, self.pad_width, self.pad_height, init_speed)
+        self.physics = Physics(self.opp, self.agent, self.width, self.height, self.ball_rad, max_speed, friction, restitution, swept)
         self.reward = 0
 
-        self.observation_space = gym.spaces.Box(np.array([0, 0, self.ball_rad - self.agent[0], self.pad_height + self.ball_rad - self.height, -self.max_speed, -self.max_speed]), 
-                                                np.array([self.height - self.pad_height, self.height - self.pad_height, self.width - self.agent[0] - self.ball_rad, self.height - self.ball_rad, self.max_speed, self.max_speed]), shape=(6,), dtype=np.float32)
+        self.observation_space = gym.spaces.Box(np.array([0, 0, self.ball_rad - self.agent.x, self.pad_height + self.ball_rad - self.height, -self.max_speed, -self.max_speed]), 
+                                                np.array([self.height - self.pad_height, self.height - self.pad_height, self.width - self.agent.x - self.ball_rad, self.height - self.ball_rad, self.max_speed, self.max_speed]), shape=(6,), dtype=np.float32)
         self.action_space = gym.spaces.Discrete(3) #, seed=42)
 
+        assert render_mode is None or render_mode in self.metadata["render_modes"]
+        self.render_mode = render_mode
+        self.render_scale = render_scale
+        self.frame = None
+        self.screen = None
+        self.clock = None
+
     def _get_obs(self):
-        rel_ball_pos = self.ball_pos - self.agent
-        return np.array([self.agent[1], self.opp[1], rel_ball_pos[0], rel_ball_pos[1], self.ball_vel[0], self.ball_vel[1]])
+        ph = self.physics
+        return np.array([self.agent.y, self.opp.y, ph.bx - self.agent.x, ph.by - self.agent.y, ph.vx, ph.vy], dtype=np.float32)
 
     def _get_info(self):
-        return {"distance": np.linalg.norm(self.ball_pos - self.agent, ord=2)}
+        ph = self.physics
+        return {"distance": ((ph.bx - self.agent.x) ** 2 + (ph.by - self.agent.y) ** 2) ** 0.5}
 
     def reset(self, options=None, seed=None):
         super().reset(seed=seed)
         self.reward = 0
-        self.agent[1] = self.np_random.uniform(0, self.height - self.pad_height)
-        self.opp[1] = self.np_random.uniform(0, self.height - self.pad_height)
-        self.ball_pos = self.np_random.uniform(np.array([self.opp[0] + self.pad_width + self.ball_rad, self.ball_rad]), np.array([self.agent[0] - self.ball_rad, self.height - self.ball_rad]), size=2).astype(np.float32)
-        self.ball_vel = self.np_random.uniform(-self.init_speed, self.init_speed, size=2).astype(np.float32)
+        ph = self.physics
+        self.agent.y = float(self.np_random.uniform(0, self.height - self.pad_height))
+        self.opp.y = float(self.np_random.uniform(0, self.height - self.pad_height))
+        self.agent.vy = self.opp.vy = 0.0
+        ph.bx, ph.by = self.np_random.uniform(np.array([self.opp.x + self.pad_width + self.ball_rad, self.ball_rad]), np.array([self.agent.x - self.ball_rad, self.height - self.ball_rad]), size=2).tolist()
+        ph.vx, ph.vy = self.np_random.uniform(-self.init_speed, self.init_speed, size=2).tolist()
 
         return self._get_obs(), self._get_info()
 
+    def get_state(self):
+        # everything step() and reset() depend on, as one STATE_DTYPE record; cheap enough to take every step
+        ph = self.physics
+        rng = self.np_random.bit_generator.state
+        if rng["bit_generator"] != "PCG64":
+            raise ValueError(f"Can only snapshot a PCG64 np_random, not {rng['bit_generator']}")
+        seed, inc = rng["state"]["state"], rng["state"]["inc"]
+        return np.array((self.agent.y, self.agent.vy, self.opp.y, self.opp.vy, (ph.bx, ph.by), (ph.vx, ph.vy), self.reward,
+                         (seed >> 64, seed & _LOW64, inc >> 64, inc & _LOW64, rng["has_uint32"], rng["uinteger"])), dtype=STATE_DTYPE)
+
+    def set_state(self, state):
+        agent_y, agent_vy, opp_y, opp_vy, ball_pos, ball_vel, reward, rng = np.asarray(state, dtype=STATE_DTYPE).item()
+        ph = self.physics
+        self.agent.y, self.agent.vy = agent_y, agent_vy
+        self.opp.y, self.opp.vy = opp_y, opp_vy
+        ph.bx, ph.by = ball_pos.tolist()
+        ph.vx, ph.vy = ball_vel.tolist()
+        self.reward = reward
+        seed_hi, seed_lo, inc_hi, inc_lo, has_uint32, uinteger = rng.tolist()
+        self.np_random.bit_generator.state = {"bit_generator": "PCG64", "state": {"state": seed_hi << 64 | seed_lo, "inc": inc_hi << 64 | inc_lo},
+                                              "has_uint32": has_uint32, "uinteger": uinteger}
+
     def step(self, action):
-        result = self.update(dt=0.016, action=action)
+        reward = 0
+        for _ in range(self.frame_skip):
+            result = self.update(dt=self.dt, action=action)
+            reward += self.reward
+            if result != -1:
+                break
         terminated = result != -1
         truncated = False
         observation = self._get_obs()
         info = self._get_info()
-        return observation, self.reward, terminated, truncated, info
+        return observation, reward, terminated, truncated, info
 
     def render(self):
-        pygame.init()
-        pygame.display.set_caption("Pong")
-        screen = pygame.display.set_mode((self.width, self.height))
-        screen.fill("white")
-        pygame.draw.rect(screen, "black", pygame.Rect(self.opp[0].item(), self.opp[1].item(), self.pad_width, self.pad_height))
-        pygame.draw.rect(screen, "black", pygame.Rect(self.agent[0].item(), self.agent[1].item(), self.pad_width, self.pad_height))
-        pygame.draw.circle(screen, "black", pygame.Vector2(self.ball_pos[0], self.ball_pos[1]), self.ball_rad)
+        if self.render_mode is None:
+            gym.logger.warn("render() called without a render_mode, e.g. GameEnv(render_mode=\"rgb_array\")")
+            return None
+
+        frame = self._draw_frame()
+        if self.render_mode == "rgb_array":
+            return frame.copy()
+
+        import pygame
+        # another env's close() may have shut pygame down under us
+        if self.screen is None or not pygame.display.get_init():
+            pygame.init()
+            pygame.display.set_caption("Pong")
+            self.screen = pygame.display.set_mode((frame.shape[1], frame.shape[0]))
+            self.clock = pygame.time.Clock()
+        pygame.event.pump()
+        pygame.surfarray.blit_array(self.screen, frame.swapaxes(0, 1))
         pygame.display.flip()
-        
-        running = True
-        while running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    running = False
+        self.clock.tick(self.metadata["render_fps"])
+
+    def _draw_frame(self):
+        # rasterises into one reused (height, width, 3) uint8 buffer, scaled by render_scale
+        s = self.render_scale
+        if self.frame is None:
+            self.frame = np.empty((round(self.height * s), round(self.width * s), 3), dtype=np.uint8)
+            r = self.ball_rad * s
+            ys, xs = np.ogrid[-int(r):int(r) + 1, -int(r):int(r) + 1]
+            self.ball_mask = xs**2 + ys**2 <= r**2
+        frame = self.frame
+        h, w = frame.shape[:2]
+        frame.fill(255)
+
+        for x, y in ((self.opp.x, self.opp.y), (self.agent.x, self.agent.y)):
+            x0, x1 = max(0, round(x * s)), min(w, round((x + self.pad_width) * s))
+            y0, y1 = max(0, round(y * s)), min(h, round((y + self.pad_height) * s))
+            frame[y0:y1, x0:x1] = 0
+
+        r = self.ball_mask.shape[0] // 2
+        cx, cy = round(self.physics.bx * s), round(self.physics.by * s)
+        x0, x1 = max(0, cx - r), min(w, cx + r + 1)
+        y0, y1 = max(0, cy - r), min(h, cy + r + 1)
+        if x0 < x1 and y0 < y1:
+            mask = self.ball_mask[y0 - (cy - r):y1 - (cy - r), x0 - (cx - r):x1 - (cx - r)]
+            frame[y0:y1, x0:x1][mask] = 0
+        return frame
+
+    def close(self):
+        if self.screen is not None:
+            import pygame
+            pygame.display.quit()
+            pygame.quit()
+            self.screen = None
+            self.clock = None
 
     def check_collisions(self):
-        cx = max(self.agent[0], min(self.ball_pos[0], self.agent[0] + self.pad_width))
-        cy = max(self.agent[1], min(self.ball_pos[1], self.agent[1] + self.pad_height))
-        
-        dx = self.ball_pos[0] - cx
-        dy = self.ball_pos[1] - cy
-        
-        if (dx**2 + dy**2) < self.ball_rad**2:
-            if abs(dx) > abs(dy):
-                v = np.linalg.norm(self.ball_vel, ord=2)
-                self.ball_vel[0] *= -1
-                self.ball_vel[1] += self.opp_vy * self.friction
-                self.ball_vel = self.ball_vel * (min(self.max_speed, v + abs(self.agent_vy) * self.restitution / self.max_speed)) / np.linalg.norm(self.ball_vel, ord=2)
-                self.ball_pos[0] = cx + (self.ball_rad if dx > 0 else -self.ball_rad)
-                self.reward += 0.1
-            else:
-                self.ball_vel[1] *= -1
-                self.ball_pos[1] = cy + (self.ball_rad if dy > 0 else -self.ball_rad)
-                self.reward -= 0.1
-            return 1 # agent
-
-        cx = max(self.opp[0], min(self.ball_pos[0], self.opp[0] + self.pad_width))
-        cy = max(self.opp[1], min(self.ball_pos[1], self.opp[1] + self.pad_height))
-        
-        dx = self.ball_pos[0] - cx
-        dy = self.ball_pos[1] - cy
-        
-        if (dx**2 + dy**2) < self.ball_rad**2:
-            if abs(dx) > abs(dy):
-                v = np.linalg.norm(self.ball_vel, ord=2)
-                self.ball_vel[0] *= -1
-                self.ball_vel[1] += self.opp_vy * self.friction
-                self.ball_vel = self.ball_vel * (min(self.max_speed, v + abs(self.opp_vy) * self.restitution / self.max_speed)) / np.linalg.norm(self.ball_vel, ord=2)
-                self.ball_pos[0] = cx + (self.ball_rad if dx > 0 else -self.ball_rad)
-            else:
-                self.ball_vel[1] *= -1
-                self.ball_pos[1] = cy + (self.ball_rad if dy > 0 else -self.ball_rad)
-            return 0 # opponent
-        return -1
-
-    def _move(self, dt, dir, player):
-        if player == 0: # opponent
-            self.opp_vy = dir * self.init_speed
-            self.opp[1] += self.opp_vy * dt
-            if self.opp[1] < 0:
-                self.opp[1] = 0
-                self.opp_vy = 0
-            if self.opp[1] > self.height * self.pad_height:
-                self.opp[1] = self.height * self.pad_height
-                self.opp_vy = 0
-        else: # agent
-            self.agent_vy = dir * self.init_speed
-            self.agent[1] += self.agent_vy * dt
-            if self.agent[1] < 0:
-                self.agent[1] = 0
-                self.agent_vy = 0
-            if self.agent[1] > self.height * self.pad_height:
-                self.agent[1] = self.height * self.pad_height
-                self.agent_vy = 0
+        # rewards every agent contact this tick, both those found along the ball's path and any overlap left over
+        hit = self.physics.collide()
+        for paddle, face in self.physics.hits:
+            if paddle == 1:
+                self.reward += 0.1 if face else -0.1
+        return hit
 
     def update(self, dt, action):
-        # opponent
-        if self.ball_pos[1] < self.opp[1]:
-            self._move(dt, -1, 0)
-        if self.ball_pos[1] > self.opp[1] + self.pad_height:
-            self._move(dt, 1, 0)
+        # opponent tracks the ball, standing still while it's level with the paddle
+        by = self.physics.by
+        if self.opponent_action is not None:
+            self.opp.move(dt, self.opponent_action, self.height)
+        elif by < self.opp.y:
+            self.opp.move(dt, -1, self.height)
+        elif by > self.opp.y + self.pad_height:
+            self.opp.move(dt, 1, self.height)
+        else:
+            self.opp.vy = 0.0
 
         # agent
-        self._move(dt, action, 1)
+        self.agent.move(dt, int(action), self.height)
 
         # ball
-        self.ball_pos += self.ball_vel * dt
-        if self.ball_pos[1] - self.ball_rad < 0:
-            self.ball_pos[1] = 2 * self.ball_rad - self.ball_pos[1]
-            self.ball_vel[1] *= -1
-        if self.ball_pos[1] + self.ball_rad > self.height:
-            self.ball_pos[1] = 2 * self.height - self.ball_pos[1] - 2 * self.ball_rad
-            self.ball_vel[1] *= -1
-
-        # score
-        if self.ball_pos[0] - self.ball_rad < 0:
+        score = self.physics.move_ball(dt)
+        if score == 1:
             self.reward += 1
             return 1 # agent
-        if self.ball_pos[0] + self.ball_rad > self.width:
+        if score == 0:
             self.reward -= 1
             return 0 # opponent
-        
+
         self.check_collisions()
         return -1
     
+FRAME_SKIPS = {"Pong-v0": 1, "PongFrameskip2-v0": 2, "PongFrameskip4-v0": 4}
+
+def register(max_episode_steps=500):
+    # max_episode_steps counts physics ticks, so the frame-skip variants get proportionally fewer steps
+    for id, k in FRAME_SKIPS.items():
+        gym.register(id=id, entry_point="game:GameEnv", max_episode_steps=max_episode_steps // k, kwargs={"frame_skip": k})
+
 def test_env():
-    gym.register(
-        id="Pong-v0",
-        entry_point="game:GameEnv",
-        max_episode_steps=1000,
-    )
-    env = gym.make("Pong-v0")
+    register(max_episode_steps=1000)
+    env = gym.make("Pong-v0", render_mode="human")
     try:
         check_env(env.unwrapped)
         print("Environment passes all checks!")
@@ -183,7 +216,10 @@ def test_env():
         #     obs, reward, terminated, truncated, info = env.step(action)
         #     new_pos = obs[0:2]
         #     print(f"Action {action}: {old_pos} -> {new_pos}, reward={reward}")
-        env.render()
+        terminated = truncated = False
+        while not (terminated or truncated):
+            obs, reward, terminated, truncated, info = env.step(0)
+            env.render()
         env.close()
     except Exception as e:
         print(f"Environment has issues: {e}")
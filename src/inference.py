@@ -0,0 +1,134 @@
+import math
+import os
+import numpy as np
+
+"""
+Torch-free forward pass for PolicyModel. Weights are pulled out of the
+state_dict once, and single observations run through preallocated buffers so
+a decision allocates nothing. Exported .npz files can be loaded without torch;
+float16 and int8 (per-row scale) exports are dequantised to float32 on load.
+"""
+
+class NumpyPolicy:
+    def __init__(self, weights, biases):
+        self.weights_t = [np.ascontiguousarray(w.T, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.in_dim = self.weights_t[0].shape[0]
+        self.out_dim = self.weights_t[-1].shape[1]
+        self.buffers = [np.empty(w.shape[1], dtype=np.float32) for w in self.weights_t]
+        self.x = np.empty(self.in_dim, dtype=np.float32)
+        layers = list(zip(self.weights_t, self.biases, self.buffers))
+        self.hidden = layers[:-1]
+        self.head = layers[-1]
+
+    @staticmethod
+    def _layers(state_dict):
+        # only the policy layers; an ActorCriticModel's value head is skipped
+        names = sorted({k.rsplit(".", 1)[0] for k in state_dict if k.startswith("net.") and k.endswith(".weight")}, key=lambda n: [int(p) if p.isdigit() else p for p in n.split(".")])
+        weights = [np.asarray(_to_numpy(state_dict[n + ".weight"]), dtype=np.float32) for n in names]
+        biases = [np.asarray(_to_numpy(state_dict[n + ".bias"]), dtype=np.float32) for n in names]
+        return weights, biases
+
+    @classmethod
+    def from_state_dict(cls, state_dict):
+        return cls(*cls._layers(state_dict))
+
+    def load_state_dict(self, state_dict):
+        weights, biases = self._layers(state_dict)
+        for wt, w in zip(self.weights_t, weights):
+            wt[...] = w.T
+        for b, new in zip(self.biases, biases):
+            b[...] = new
+
+    @classmethod
+    def load(cls, filepath):
+        if filepath.endswith(".npz"):
+            with np.load(filepath) as data:
+                n = int(data["n_layers"])
+                weights = [_dequantise(data, f"w{i}") for i in range(n)]
+                biases = [data[f"b{i}"].astype(np.float32) for i in range(n)]
+            return cls(weights, biases)
+
+        import torch
+        return cls.from_state_dict(torch.load(filepath, map_location="cpu", weights_only=True))
+
+    def probs(self, obs):
+        # batched: obs (n, in_dim) -> (n, out_dim)
+        h = np.asarray(obs, dtype=np.float32)
+        last = len(self.weights_t) - 1
+        for i, (wt, b) in enumerate(zip(self.weights_t, self.biases)):
+            h = h @ wt
+            h += b
+            if i < last:
+                np.tanh(h, out=h)
+        h -= h.max(axis=-1, keepdims=True)
+        np.exp(h, out=h)
+        h /= h.sum(axis=-1, keepdims=True)
+        return h
+
+    def _logits_one(self, obs):
+        h = self.x
+        h[...] = obs
+        for wt, b, out in self.hidden:
+            np.dot(h, wt, out=out)
+            np.add(out, b, out=out)
+            np.tanh(out, out=out)
+            h = out
+        wt, b, out = self.head
+        np.dot(h, wt, out=out)
+        np.add(out, b, out=out)
+        return out
+
+    def probs_one(self, obs):
+        # single observation; the returned array is reused by the next call
+        h = self._logits_one(obs)
+        h -= h.max()
+        np.exp(h, out=h)
+        h /= h.sum()
+        return h
+
+    def sample(self, obs, rng):
+        # softmax over a handful of logits is cheaper in plain floats than in numpy calls
+        logits = self._logits_one(obs).tolist()
+        top = max(logits)
+        exps = [math.exp(l - top) for l in logits]
+        u = rng.random() * sum(exps)
+        for i, e in enumerate(exps):
+            u -= e
+            if u < 0:
+                return i
+        return len(exps) - 1
+
+    def sample_batch(self, obs, rng):
+        cdf = np.cumsum(self.probs(obs), axis=-1)
+        u = rng.random((cdf.shape[0], 1), dtype=np.float32)
+        return np.minimum((u >= cdf).sum(axis=-1), self.out_dim - 1)
+
+def _to_numpy(tensor):
+    if hasattr(tensor, "detach"):
+        return tensor.detach().cpu().numpy()
+    return tensor
+
+def _dequantise(data, key):
+    w = data[key]
+    if w.dtype == np.int8:
+        return w.astype(np.float32) * data[key + "_scale"][:, None]
+    return w.astype(np.float32)
+
+def export(state_dict, filepath, dtype="float32"):
+    # dtype: "float32", "float16" or "int8"
+    weights, biases = NumpyPolicy._layers(state_dict)
+    arrays = {"n_layers": np.array(len(weights))}
+    for i, (w, b) in enumerate(zip(weights, biases)):
+        if dtype == "int8":
+            scale = np.abs(w).max(axis=1) / 127
+            scale[scale == 0] = 1
+            arrays[f"w{i}"] = np.round(w / scale[:, None]).astype(np.int8)
+            arrays[f"w{i}_scale"] = scale.astype(np.float32)
+        elif dtype in ("float16", "float32"):
+            arrays[f"w{i}"] = w.astype(dtype)
+        else:
+            raise ValueError(f"Unknown export dtype {dtype}")
+        arrays[f"b{i}"] = b
+    os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+    np.savez(filepath, **arrays)
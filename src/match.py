@@ -0,0 +1,150 @@
+import time
+import numpy as np
+from evaluate import wilson_interval
+from pong import Agent, Game, WIDTH, HEIGHT
+
+"""
+Headless matches under pong.Game's own rules: full max_score matches with
+the real paddles, ball resets and scoring, but no window, clock or drawing,
+stepped at a fixed dt as fast as the CPU allows.
+
+Each side is driven by a controller, a callable (game, side) -> direction
+(-1 up, 0 stay, 1 down) with side 0 the left paddle and 1 the right:
+
+    Tracker()                     the scripted opponent from GameEnv
+    AgentController(agent)        a pong.Agent with a loaded model, on either side
+    ReplayController(directions)  a recorded sequence of directions
+
+Games are seeded, so a match replays exactly given the same controllers;
+Recorder wraps a controller and keeps what it did.
+
+    python cli.py match --left tracker --right ../models/r50_redrew.npz --matches 200
+"""
+
+class Tracker:
+    # moves towards the ball, standing still while it's level with the paddle
+    def __call__(self, game, side):
+        paddle = game.physics.paddles[side]
+        by = game.physics.by
+        if by < paddle.y:
+            return -1
+        if by > paddle.y + paddle.height:
+            return 1
+        return 0
+
+class AgentController:
+    def __init__(self, agent):
+        self.agent = agent
+
+    def __call__(self, game, side):
+        return self.agent.decide(game.get_state() if side == 1 else game.get_mirrored_state())
+
+class ReplayController:
+    def __init__(self, directions):
+        self.directions = np.asarray(directions, dtype=np.int8).tolist()
+        self.tick = 0
+
+    def __call__(self, game, side):
+        if self.tick >= len(self.directions):
+            raise IndexError(f"Replay ran out after {self.tick} ticks")
+        direction = self.directions[self.tick]
+        self.tick += 1
+        return direction
+
+class Recorder:
+    def __init__(self, controller):
+        self.controller = controller
+        self.directions = []
+
+    def __call__(self, game, side):
+        direction = self.controller(game, side)
+        self.directions.append(direction)
+        return direction
+
+    def save(self, path):
+        np.save(path, np.asarray(self.directions, dtype=np.int8))
+
+def load_controller(spec, frame_skip=1, seed=None):
+    # "tracker", "replay:<file.npy>" or a model path
+    if spec == "tracker":
+        return Tracker()
+    if spec.startswith("replay:"):
+        return ReplayController(np.load(spec[len("replay:"):]))
+    agent = Agent(WIDTH * 0.9, HEIGHT * 0.5, WIDTH * 0.04, HEIGHT * 0.25, 600, frame_skip)
+    agent.load(spec)
+    agent.rng = np.random.default_rng(seed)
+    return AgentController(agent)
+
+def play_match(game, dt=1 / 60, max_seconds=600):
+    # returns the match's statistics; a match still going after max_seconds of game time has no winner
+    hits = [0, 0]
+    face_hits = [0, 0]
+    points = 0
+    ticks = 0
+    max_ticks = round(max_seconds / dt)
+    winner = -1
+    # start from 0-0 and a fresh serve, whatever the last match (e.g. an unfinished one) left behind
+    for player in (game.player1, game.player2):
+        player.score = 0
+        player.reset()
+    game.ball.reset()
+    game.final_score = None
+    game.waiting = False
+    while ticks < max_ticks:
+        result = game.update(dt)
+        ticks += 1
+        for side, face in game.physics.hits:
+            hits[side] += 1
+            face_hits[side] += face
+        if game.waiting:
+            # a point was scored; headless games don't wait for ENTER
+            points += 1
+            game.waiting = False
+        if result != -1:
+            # update() returns the side that won the last point
+            winner = result
+            break
+    score = game.final_score if winner != -1 else (game.player1.score, game.player2.score)
+    game.final_score = None
+    return {"winner": winner, "score": score, "points": points, "ticks": ticks, "seconds": ticks * dt,
+            "hits": hits, "face_hits": face_hits}
+
+def run_matches(left, right, matches=100, seed=0, dt=1 / 60, max_score=5, max_seconds=600, **game_kwargs):
+    game = Game(max_score=max_score, headless=True, seed=seed, **game_kwargs)
+    game.controllers = [left, right]
+    results = []
+    start = time.perf_counter()
+    for _ in range(matches):
+        results.append(play_match(game, dt, max_seconds))
+    return summarise(results, time.perf_counter() - start)
+
+def summarise(results, elapsed):
+    n = len(results)
+    wins = [sum(r["winner"] == side for r in results) for side in (0, 1)]
+    points = sum(r["points"] for r in results)
+    hits = [sum(r["hits"][side] for r in results) for side in (0, 1)]
+    return {
+        "matches": n,
+        "left_wins": wins[0],
+        "right_wins": wins[1],
+        "unfinished": n - wins[0] - wins[1],
+        "right_win_rate": wins[1] / n if n else 0.0,
+        "right_win_rate_ci": wilson_interval(wins[1], n),
+        "points_per_match": points / n if n else 0.0,
+        "right_point_share": sum(r["score"][1] for r in results) / max(1, sum(sum(r["score"]) for r in results)),
+        "hits_per_point": (hits[0] + hits[1]) / max(1, points),
+        "face_hit_rate": [sum(r["face_hits"][side] for r in results) / max(1, hits[side]) for side in (0, 1)],
+        "seconds_per_match": sum(r["seconds"] for r in results) / n if n else 0.0,
+        "matches_per_second": n / elapsed if elapsed > 0 else float("inf"),
+    }
+
+def report(stats, left="left", right="right"):
+    lo, hi = stats["right_win_rate_ci"]
+    print(f"{right} (right) vs {left} (left) over {stats['matches']} matches")
+    print(f"  wins {stats['right_wins']} - {stats['left_wins']}, {stats['unfinished']} unfinished; "
+          f"right win rate {stats['right_win_rate']:.3f} [{max(0.0, lo):.3f}, {min(1.0, hi):.3f}]")
+    print(f"  right point share {stats['right_point_share']:.3f}, {stats['points_per_match']:.1f} points and "
+          f"{stats['seconds_per_match']:.1f}s of game time per match, {stats['hits_per_point']:.2f} hits per point")
+    face_left, face_right = stats["face_hit_rate"]
+    print(f"  face hit rate left {face_left:.3f}, right {face_right:.3f}")
+    print(f"  {stats['matches_per_second']:.1f} matches/s")
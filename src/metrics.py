@@ -0,0 +1,217 @@
+import argparse
+import math
+import os
+import sys
+
+"""
+Constant-memory training metrics. RollingStats keeps an exact mean,
+variance and percentiles over the last `window` episodes plus running P²
+estimates of the same percentiles over the whole run. MetricsWriter appends one CSV row per
+episode; the plot command streams those files back and buckets them down to
+a fixed number of points, so neither side grows with the number of episodes.
+
+    python metrics.py plot ../logs/metrics_s3.csv [more.csv ...] --points 500
+"""
+
+class P2Quantile:
+    # Jain & Chlamtac's P² estimator: five markers, O(1) memory and update
+    def __init__(self, q):
+        self.q = q
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self.increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def add(self, x):
+        h = self.heights
+        if len(h) < 5:
+            h.append(x)
+            h.sort()
+            return
+
+        if x < h[0]:
+            h[0] = x
+            k = 0
+        elif x >= h[4]:
+            h[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= h[k + 1]:
+                k += 1
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = h[i] + d / (n[i + 1] - n[i - 1]) * ((n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i]) + (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1]))
+                if not h[i - 1] < candidate < h[i + 1]:
+                    candidate = h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+                h[i] = candidate
+                n[i] += d
+
+    def value(self):
+        h = self.heights
+        if not h:
+            return math.nan
+        if len(h) < 5:
+            return h[min(len(h) - 1, int(self.q * len(h)))]
+        return h[2]
+
+class RollingStats:
+    def __init__(self, window=250, quantiles=(0.1, 0.5, 0.9)):
+        self.window = window
+        self.values = [0.0] * window
+        self.head = 0
+        self.size = 0
+        self.sum = 0.0
+        self.sq_sum = 0.0
+        self.count = 0
+        self.total = 0.0
+        self.quantiles = {q: P2Quantile(q) for q in quantiles}
+
+    def add(self, x):
+        x = float(x)
+        if self.size == self.window:
+            old = self.values[self.head]
+            self.sum -= old
+            self.sq_sum -= old * old
+        else:
+            self.size += 1
+        self.values[self.head] = x
+        self.head = (self.head + 1) % self.window
+        self.sum += x
+        self.sq_sum += x * x
+        self.count += 1
+        self.total += x
+        for estimator in self.quantiles.values():
+            estimator.add(x)
+
+    @property
+    def mean(self):
+        return self.sum / self.size if self.size else math.nan
+
+    @property
+    def var(self):
+        if self.size < 2:
+            return 0.0
+        return max(0.0, (self.sq_sum - self.sum * self.sum / self.size) / (self.size - 1))
+
+    @property
+    def overall_mean(self):
+        return self.total / self.count if self.count else math.nan
+
+    def percentile(self, q):
+        # over the window, interpolating between the closest ranks like numpy.percentile
+        if not self.size:
+            return math.nan
+        values = sorted(self.values[:self.size])
+        pos = q * (self.size - 1)
+        lo = int(pos)
+        hi = min(lo + 1, self.size - 1)
+        return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+    def summary(self):
+        result = {"mean": self.mean, "std": math.sqrt(self.var), "overall_mean": self.overall_mean, "count": self.count}
+        for q, estimator in self.quantiles.items():
+            result[f"p{round(q * 100)}"] = self.percentile(q)
+            result[f"overall_p{round(q * 100)}"] = estimator.value()
+        return result
+
+class MetricsWriter:
+    columns = ("episode", "return", "length")
+
+    def __init__(self, path, truncate_at=None):
+        # truncate_at drops rows written after a checkpoint that's being resumed from
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a+")
+        if truncate_at is not None:
+            self.file.truncate(truncate_at)
+            self.file.seek(0, os.SEEK_END)
+        elif new:
+            self.file.write(",".join(self.columns) + "\n")
+
+    def write(self, episode, ret, length):
+        self.file.write(f"{episode},{ret:.6g},{length}\n")
+
+    def tell(self):
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+def read_rows(path):
+    # streams (episode, return, length) rows without loading the file
+    with open(path) as f:
+        next(f, None)
+        for line in f:
+            episode, ret, length = line.rstrip("\n").split(",")
+            yield int(episode), float(ret), int(length)
+
+def downsample(path, points):
+    # bucketed (episode, mean, min, max) of the returns, two streaming passes over the file
+    with open(path) as f:
+        n = max(0, sum(1 for _ in f) - 1)
+    size = max(1, math.ceil(n / points))
+    buckets = []
+    count = total = 0
+    lo, hi = math.inf, -math.inf
+    for episode, ret, _ in read_rows(path):
+        count += 1
+        total += ret
+        lo = min(lo, ret)
+        hi = max(hi, ret)
+        if count == size:
+            buckets.append((episode, total / count, lo, hi))
+            count = total = 0
+            lo, hi = math.inf, -math.inf
+    if count:
+        buckets.append((episode, total / count, lo, hi))
+    return buckets
+
+def plot(paths, points=500, out=None):
+    import matplotlib
+    if out is not None:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    plt.rcParams["figure.figsize"] = (10, 5)
+    fig, ax = plt.subplots()
+    for path in paths:
+        buckets = downsample(path, points)
+        if not buckets:
+            continue
+        episodes, means, lows, highs = zip(*buckets)
+        line, = ax.plot(episodes, means, label=os.path.basename(path))
+        ax.fill_between(episodes, lows, highs, alpha=0.2, color=line.get_color())
+    ax.set(title="REINFORCE for Pong", xlabel="episodes", ylabel="reward")
+    ax.grid(True)
+    if len(paths) > 1:
+        ax.legend()
+    if out is not None:
+        fig.savefig(out)
+    else:
+        plt.show()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Training metrics tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    plot_parser = sub.add_parser("plot", help="plot episode returns from metrics files")
+    plot_parser.add_argument("paths", nargs="+")
+    plot_parser.add_argument("--points", type=int, default=500, help="buckets per file")
+    plot_parser.add_argument("--out", help="save to this image instead of showing a window")
+    args = parser.parse_args(argv)
+
+    if args.command == "plot":
+        plot(args.paths, args.points, args.out)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
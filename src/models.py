@@ -16,4 +16,15 @@ class PolicyModel(nn.Module):
 
     def forward(self, input):
         output = self.net(input)
-        return output
\ No newline at end of file
+        return output
+
+class ActorCriticModel(PolicyModel):
+    # PolicyModel plus a value head on the second hidden layer; the net.* weights load anywhere a PolicyModel's do
+    def __init__(self, in_dim=6, hidden_dims=(50, 50), out_dim=3):
+        super(ActorCriticModel, self).__init__(in_dim, hidden_dims, out_dim)
+        self.value = nn.Linear(hidden_dims[1], 1)
+
+    def forward_value(self, input):
+        features = self.net[:4](input)
+        probs = self.net[4:](features)
+        return probs, self.value(features).squeeze(-1)
@@ -0,0 +1,238 @@
+"""
+Ball and paddle physics shared by game.GameEnv and pong.Game. Everything is
+plain Python floats on __slots__ objects; no NumPy or pygame in the hot path.
+
+Paddle 0 is the left one (GameEnv's opponent, pong's player1) and paddle 1
+the right one (GameEnv's agent, pong's player2). move_ball() and step()
+return 1 when the ball leaves on the left (right paddle scores), 0 when it
+leaves on the right, and -1 otherwise.
+
+With swept=True (the default) move_ball() works out the exact time of each
+contact with the walls and paddles along the ball's path and bounces it
+there, any number of times per step, so fast balls can't tunnel through a
+paddle and results don't depend on dt. Paddles are treated as standing still
+at their new positions while the ball moves. swept=False is the original
+discrete test: move the whole step, then push the ball out of anything it
+overlaps. Every paddle contact during a step is listed in hits as
+(paddle index, face hit).
+"""
+
+WIDTH, HEIGHT = 1280, 720
+PAD_WIDTH = WIDTH * 0.04
+PAD_HEIGHT = HEIGHT * 0.25
+BALL_RAD = WIDTH * 0.02
+LEFT_X = WIDTH * 0.1 - PAD_WIDTH / 2
+RIGHT_X = WIDTH * 0.9 - PAD_WIDTH / 2
+
+class Paddle:
+    __slots__ = ("x", "y", "width", "height", "speed", "vy")
+
+    def __init__(self, x, y, width=PAD_WIDTH, height=PAD_HEIGHT, speed=600):
+        self.x = float(x)
+        self.y = float(y)
+        self.width = float(width)
+        self.height = float(height)
+        self.speed = float(speed)
+        self.vy = 0.0
+
+    def move(self, dt, dir, limit=HEIGHT):
+        vy = dir * self.speed
+        y = self.y + vy * dt
+        if y < 0:
+            y = 0.0
+            vy = 0.0
+        elif y > limit - self.height:
+            y = limit - self.height
+            vy = 0.0
+        self.y = y
+        self.vy = vy
+
+class Physics:
+    __slots__ = ("paddles", "width", "height", "ball_rad", "max_speed", "friction", "restitution", "bx", "by", "vx", "vy", "face_hit", "swept", "hits")
+
+    # cap on contacts resolved in one step; only reachable if the ball is wedged between a paddle and a wall
+    MAX_CONTACTS = 16
+
+    def __init__(self, left, right, width=WIDTH, height=HEIGHT, ball_rad=BALL_RAD, max_speed=3000, friction=1, restitution=15, swept=True):
+        self.paddles = [left, right]
+        self.width = float(width)
+        self.height = float(height)
+        self.ball_rad = float(ball_rad)
+        self.max_speed = float(max_speed)
+        self.friction = float(friction)
+        self.restitution = float(restitution)
+        self.bx = self.by = self.vx = self.vy = 0.0
+        # whether the last paddle hit was on a paddle's face rather than its top/bottom
+        self.face_hit = False
+        self.swept = swept
+        self.hits = []
+
+    def move_ball(self, dt):
+        self.hits.clear()
+        if self.swept:
+            return self._sweep(dt)
+        r = self.ball_rad
+        self.bx += self.vx * dt
+        by = self.by + self.vy * dt
+
+        # wall hit
+        if by - r < 0:
+            by = 2 * r - by
+            self.vy = -self.vy
+        if by + r > self.height:
+            by = 2 * self.height - by - 2 * r
+            self.vy = -self.vy
+        self.by = by
+
+        # score
+        if self.bx - r < 0:
+            return 1
+        if self.bx + r > self.width:
+            return 0
+        return -1
+
+    def _sweep(self, dt, last=-1, contacts=MAX_CONTACTS):
+        # last and contacts let a caller resume a sweep: the paddle hit last and the contacts left to resolve
+        r = self.ball_rad
+        top, bottom = r, self.height - r
+        left, right = r, self.width - r
+        for _ in range(contacts):
+            bx, by, vx, vy = self.bx, self.by, self.vx, self.vy
+
+            # earliest event in [0, dt]: kind 0 wall, 1 score, 2 paddle
+            t, kind = dt, -1
+            if vy < 0 and (top - by) / vy < t:
+                t, kind = max(0.0, (top - by) / vy), 0
+            elif vy > 0 and (bottom - by) / vy < t:
+                t, kind = max(0.0, (bottom - by) / vy), 0
+            if vx < 0 and (left - bx) / vx <= t:
+                t, kind = max(0.0, (left - bx) / vx), 1
+            elif vx > 0 and (right - bx) / vx <= t:
+                t, kind = max(0.0, (right - bx) / vx), 1
+            hit, nx, ny = -1, 0.0, 0.0
+            for i, p in enumerate(self.paddles):
+                contact = _time_of_impact(bx, by, vx, vy, r, p, t)
+                # a glancing corner bounce can leave the ball grazing the paddle it just left
+                if contact is not None and (contact[0] > 0 or i != last):
+                    t, nx, ny = contact
+                    kind, hit = 2, i
+
+            self.bx = bx + vx * t
+            self.by = by + vy * t
+            dt -= t
+            if kind == -1:
+                return -1
+            if kind == 1:
+                return 1 if vx < 0 else 0
+            if kind == 0:
+                self.vy = -vy
+            else:
+                self._bounce(self.paddles[hit], nx, ny)
+                self.hits.append((hit, self.face_hit))
+                last = hit
+
+        # out of contacts: finish the step without resolving any more
+        self.bx += self.vx * dt
+        self.by = min(bottom, max(top, self.by + self.vy * dt))
+        if self.bx < left:
+            return 1
+        if self.bx > right:
+            return 0
+        return -1
+
+    def _bounce(self, p, nx, ny):
+        # reflect about the contact normal; hits on a paddle's face (rather than its top/bottom) also pick up
+        # the paddle's motion and speed up
+        d = self.vx * nx + self.vy * ny
+        vx = self.vx - 2 * d * nx
+        vy = self.vy - 2 * d * ny
+        face = abs(nx) > abs(ny)
+        if face:
+            v = (self.vx * self.vx + self.vy * self.vy) ** 0.5
+            vy += p.vy * self.friction
+            speed = min(self.max_speed, v + abs(p.vy) * self.restitution / p.speed)
+            norm = (vx * vx + vy * vy) ** 0.5
+            if norm > 0:
+                vx *= speed / norm
+                vy *= speed / norm
+        self.vx = vx
+        self.vy = vy
+        self.face_hit = face
+
+    def collide(self):
+        # returns the index of the paddle the ball overlaps, or -1. When swept this only catches a paddle
+        # that moved into the ball, and ignores overlaps the ball is already leaving.
+        bx, by, r = self.bx, self.by, self.ball_rad
+        for i, p in enumerate(self.paddles):
+            right = p.x + p.width
+            bottom = p.y + p.height
+            cx = p.x if bx < p.x else (right if bx > right else bx)
+            cy = p.y if by < p.y else (bottom if by > bottom else by)
+
+            dx = bx - cx
+            dy = by - cy
+            if dx * dx + dy * dy < r * r:
+                if self.swept and dx * self.vx + dy * self.vy > 0:
+                    continue
+                face = abs(dx) > abs(dy)
+                if face:
+                    self._bounce(p, 1.0, 0.0)
+                else:
+                    self._bounce(p, 0.0, 1.0)
+                if face:
+                    self.bx = cx + (r if dx > 0 else -r)
+                else:
+                    self.by = cy + (r if dy > 0 else -r)
+                self.hits.append((i, face))
+                return i
+        return -1
+
+    def step(self, dt):
+        score = self.move_ball(dt)
+        if score != -1:
+            return score
+        self.collide()
+        return -1
+
+def _time_of_impact(bx, by, vx, vy, r, p, limit):
+    # first time in [0, limit) that a ball at (bx, by) moving at (vx, vy) touches paddle p, with the contact
+    # normal, or None. The ball touches the paddle when its centre reaches the paddle's rectangle grown by r
+    # with rounded corners, so test the four straight sides and then the four corner circles.
+    x0, x1 = p.x, p.x + p.width
+    y0, y1 = p.y, p.y + p.height
+    best = None
+    if vx > 0 and bx <= x0 - r:
+        t = (x0 - r - bx) / vx
+        if t < limit and y0 <= by + vy * t <= y1:
+            best, limit = (t, -1.0, 0.0), t
+    elif vx < 0 and bx >= x1 + r:
+        t = (x1 + r - bx) / vx
+        if t < limit and y0 <= by + vy * t <= y1:
+            best, limit = (t, 1.0, 0.0), t
+    if vy > 0 and by <= y0 - r:
+        t = (y0 - r - by) / vy
+        if t < limit and x0 <= bx + vx * t <= x1:
+            best, limit = (t, 0.0, -1.0), t
+    elif vy < 0 and by >= y1 + r:
+        t = (y1 + r - by) / vy
+        if t < limit and x0 <= bx + vx * t <= x1:
+            best, limit = (t, 0.0, 1.0), t
+
+    a = vx * vx + vy * vy
+    if a == 0:
+        return best
+    for cx, cy in ((x0, y0), (x1, y0), (x0, y1), (x1, y1)):
+        dx = bx - cx
+        dy = by - cy
+        b = dx * vx + dy * vy
+        c = dx * dx + dy * dy - r * r
+        # only a ball outside the circle and heading into it
+        if b >= 0 or c < 0:
+            continue
+        disc = b * b - a * c
+        if disc < 0:
+            continue
+        t = (-b - disc ** 0.5) / a
+        if t < limit:
+            best, limit = (t, (dx + vx * t) / r, (dy + vy * t) / r), t
+    return best
@@ -0,0 +1,118 @@
+import numpy as np
+from game import GameEnv, STATE_DTYPE
+from vector_env import VectorPongEnv
+
+"""
+Monte Carlo lookahead from GameEnv snapshots. For every state to plan from,
+each of the three directions is tried as the first move and followed by
+`rollouts` random (or policy) continuations of `horizon` decisions. All of
+them run side by side as rows of one VectorPongEnv, so planning several
+states costs one batched simulation. A move's value is the mean discounted
+return of its rollouts.
+
+The planner can play either paddle. For the agent (side 1), the opponent
+in the rollouts is the scripted tracker that GameEnv uses, unless
+other_policy is given. For the opponent (side 0), it minimises the agent's
+return and needs a model of the agent: other_policy, or random moves.
+
+    planner = MonteCarloPlanner()
+    action = planner.act(env.get_state())                # teacher: direction for the agent
+    env.opponent_action = opponent.act(env.get_state())  # with MonteCarloPlanner(side=0)
+
+Rollouts run on VectorPongEnv's fixed 16ms tick with the same swept
+collisions as the default GameEnv, so a snapshot plays out identically in
+both; plan for GameEnv(swept=False) with env_kwargs={"swept": False}.
+"""
+
+class MonteCarloPlanner:
+    def __init__(self, rollouts=32, horizon=40, gamma=0.99, side=1, policy=None, other_policy=None, frame_skip=1,
+                 seed=0, env_kwargs=None):
+        # policy / other_policy: NumpyPolicy-likes with sample_batch, for this side's continuations and the other side
+        self.rollouts = rollouts
+        self.horizon = horizon
+        self.gamma = gamma
+        self.side = side
+        self.policy = policy
+        self.other_policy = other_policy
+        self.frame_skip = frame_skip
+        self.env_kwargs = env_kwargs or {}
+        self.rng = np.random.default_rng(seed)
+        self.env = None
+
+    def _env(self, n):
+        if self.env is None or self.env.num_envs != n:
+            self.env = VectorPongEnv(n, **self.env_kwargs)
+            self.env.reset(seed=int(self.rng.integers(1 << 31)))
+        return self.env
+
+    def _directions(self, policy, env, side):
+        obs = env.obs if side == 1 else env.opponent_obs()
+        return policy.sample_batch(obs, self.rng) - 1
+
+    def values(self, states):
+        # states: STATE_DTYPE records, shape (n,) or a single one -> (n, 3) values of moving up, staying, moving down
+        states = np.atleast_1d(np.asarray(states, dtype=STATE_DTYPE))
+        n, k = len(states), self.rollouts
+        env = self._env(n * 3 * k)
+        # rows are grouped by state, then first move, then rollout
+        env.set_state(np.repeat(states, 3 * k))
+        env.reward[:] = 0
+        first = np.tile(np.repeat(np.array([-1, 0, 1]), k), n)
+        # without a policy, each rollout keeps making its first move for a random number of decisions then stands
+        # still, i.e. it tries heading for some other spot; independent random moves barely shift the paddle
+        hold = self.rng.integers(1, self.horizon + 1, env.num_envs)
+
+        returns = np.zeros(env.num_envs)
+        previous = np.zeros(env.num_envs)
+        live = np.ones(env.num_envs, dtype=bool)
+        discount = 1.0
+        for t in range(self.horizon):
+            if t == 0 or self.policy is None:
+                mine = np.where(t < hold, first, 0)
+            else:
+                mine = self._directions(self.policy, env, self.side)
+            if self.side == 1:
+                agent = mine
+                env.opponent_actions = None if self.other_policy is None else self._directions(self.other_policy, env, 0)
+            else:
+                agent = self.rng.integers(-1, 2, env.num_envs) if self.other_policy is None else self._directions(self.other_policy, env, 1)
+                env.opponent_actions = mine
+            for _ in range(self.frame_skip):
+                # env rewards accumulate over a game, so score the change in each tick
+                _, rewards, terminated, truncated, _ = env.step(agent)
+                returns[live] += discount * (rewards[live] - previous[live])
+                previous = rewards
+                live &= ~(terminated | truncated)
+                discount *= self.gamma
+            if not live.any():
+                break
+
+        if self.side == 0:
+            returns = -returns
+        return returns.reshape(n, 3, k).mean(axis=2)
+
+    def act_batch(self, states):
+        values = self.values(states)
+        best = values.argmax(axis=1)
+        # no difference within the horizon (the ball is far away): stand still
+        best[values.max(axis=1) - values.min(axis=1) < 1e-9] = 1
+        return best - 1
+
+    def act(self, state):
+        return int(self.act_batch(state)[0])
+
+def demonstrations(planner, episodes, seed=0, max_steps=500, env_kwargs=None):
+    # expert data for the agent side: observations and the planner's action indices (direction + 1) from GameEnv games
+    env = GameEnv(**(env_kwargs or {}))
+    observations, actions = [], []
+    for episode in range(episodes):
+        obs, info = env.reset(seed=seed + episode)
+        for _ in range(max_steps):
+            direction = planner.act(env.get_state())
+            observations.append(obs)
+            actions.append(direction + 1)
+            obs, reward, terminated, truncated, info = env.step(direction)
+            if terminated:
+                break
+    env.close()
+    return np.array(observations, dtype=np.float32), np.array(actions, dtype=np.int64)
@@ -1,9 +1,9 @@
 import pygame
 import random
-import models
-import torch
 import numpy as np
 import os
+from inference import NumpyPolicy
+from physics import Paddle, Physics
 
 WIDTH, HEIGHT = 1280, 720
 
@@ -16,85 +16,208 @@ class Player:
         self.width = w
         self.height = h
         self.orig = (x - w/2, y - h/2)
-        self.rect = pygame.Rect(x - w/2, y - h/2, w, h)
-        self.velocity = 0
+        self.paddle = Paddle(x - w/2, y - h/2, w, h, v)
 
-    def move(self, dt, dir):
-        self.velocity = dir * self.max_speed
+    @property
+    def rect(self):
+        return pygame.Rect(round(self.paddle.x), round(self.paddle.y), round(self.width), round(self.height))
+
+    @property
+    def velocity(self):
+        return self.paddle.vy
 
-        self.rect.y += self.velocity * dt
-        if self.rect.y < 0:
-            self.rect.y = 0
-            self.velocity = 0
-        if self.rect.y > HEIGHT - self.height:
-            self.rect.y = HEIGHT - self.height
-            self.velocity = 0
+    @velocity.setter
+    def velocity(self, value):
+        self.paddle.vy = value
+
+    def move(self, dt, dir):
+        self.paddle.move(dt, dir, HEIGHT)
 
     def reset(self):
-        self.rect.x = self.orig[0]
-        self.rect.y = self.orig[1]
-        self.velocity = 0
+        self.paddle.x = self.orig[0]
+        self.paddle.y = self.orig[1]
+        self.paddle.vy = 0.0
 
 class Agent(Player):
-    def __init__(self, x, y, w, h, v):
+    def __init__(self, x, y, w, h, v, frame_skip=1):
         super().__init__(x, y, w, h, v, None, None)
         self.net = None
+        self.rng = np.random.default_rng()
+        # decide every frame_skip frames and repeat the action in between, as in GameEnv(frame_skip=k)
+        self.frame_skip = frame_skip
+        self.frames = 0
+        self.action = 0
 
-    def _move(self, dt, state):
-        state = torch.tensor(state)
-        probs = self.net(state)
+    def decide(self, state):
+        if self.frames % self.frame_skip == 0:
+            self.action = self.net.sample(state, self.rng)
+        self.frames += 1
+        # action indices are direction + 1, as in GameEnv
+        return self.action - 1
 
-        dist = torch.distributions.Categorical(probs)
-        action = dist.sample().numpy()
-        if action == 0:
-            self.move(dt, -1)
-        else:
-            self.move(dt, 1)
+    def _move(self, dt, state):
+        self.move(dt, self.decide(state))
 
     def load(self, filepath):
-        device = torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
-        self.net = models.PolicyModel().to(device)
-        self.net.load_state_dict(torch.load(filepath, weights_only=True))
+        # .npz exports load without torch; .pth state_dicts need it
+        self.net = NumpyPolicy.load(filepath)
+
+    def connect(self, address):
+        # moves come from a serve.PolicyServer shared with other games
+        from serve import PolicyClient
+        self.net = PolicyClient(address)
 
 class Ball:
-    def __init__(self, x, y, r, vi, vm):
+    # view onto the ball state held by a Physics instance
+    def __init__(self, physics, x, y, vi, rng=random):
         self.colour = "black"
+        self.physics = physics
+        self.rng = rng
         self.speed = vi
-        self.max_speed = vm
-        self.radius = r
-        self.orig = pygame.Vector2(x, y)
-        self.pos = pygame.Vector2(x, y)
-        self.vel = pygame.Vector2(2 * random.random() - 1, random.random() - 0.5)
-        self.vel.scale_to_length(self.speed)
+        self.radius = physics.ball_rad
+        self.max_speed = physics.max_speed
+        self.orig = (x, y)
+        self.reset()
+
+    @property
+    def pos(self):
+        return pygame.Vector2(self.physics.bx, self.physics.by)
+
+    @property
+    def vel(self):
+        return pygame.Vector2(self.physics.vx, self.physics.vy)
 
     def move(self, dt):
-        self.pos += self.vel * dt
-
-        # wall hit
-        if self.pos.y - self.radius < 0:
-            self.pos.y = 2 * self.radius - self.pos.y
-            self.vel.y *= -1
-        if self.pos.y + self.radius > HEIGHT:
-            self.pos.y = 2 * HEIGHT - self.pos.y - 2 * self.radius
-            self.vel.y *= -1
-
-        # score
-        if self.pos.x - self.radius < 0:
-            return 1
-        if self.pos.x + self.radius > WIDTH:
-            return 0
-        return -1
+        return self.physics.move_ball(dt)
 
     def reset(self):
-        self.pos = self.orig.copy()
-        self.vel.update(2 * random.random() - 1, random.random() - 0.5)
-        self.vel.scale_to_length(self.speed)
+        ph = self.physics
+        ph.bx, ph.by = self.orig
+        vx, vy = 2 * self.rng.random() - 1, self.rng.random() - 0.5
+        norm = (vx * vx + vy * vy) ** 0.5
+        ph.vx = vx * self.speed / norm
+        ph.vy = vy * self.speed / norm
+
+class Renderer:
+    # Draws a Game onto its screen, repainting only what changed since the last frame. Fonts and text surfaces
+    # are made once (the score once per distinct score). A paddle that slid repaints just the strips it left and
+    # entered, the ball its old and new boxes, and text only when it appears, goes or changes. Those areas are
+    # cleared, everything overlapping them is redrawn clipped to them, and only they are passed to
+    # display.update(). The whole screen is repainted on the first frame or after invalidate(), e.g. when the
+    # window is exposed.
+    def __init__(self, screen, background="white", colour="black"):
+        self.screen = screen
+        self.background = background
+        self.colour = colour
+        self.fonts = {}
+        self.texts = {}
+        self.items = {}
+        self.full = True
+
+    def invalidate(self):
+        self.full = True
+
+    def _text(self, text, size):
+        key = (text, size)
+        surface = self.texts.get(key)
+        if surface is None:
+            font = self.fonts.get(size)
+            if font is None:
+                font = self.fonts[size] = pygame.font.Font(None, size)
+            surface = self.texts[key] = font.render(text, True, self.colour)
+        return surface
+
+    def _items(self, game):
+        # name -> (bounding rect, content): None for a paddle, (centre, radius) for the ball, else a text surface
+        items = {"left": (game.player1.rect, None), "right": (game.player2.rect, None)}
+        x, y, r = game.physics.bx, game.physics.by, game.ball.radius
+        box = pygame.Rect(int(x - r) - 1, int(y - r) - 1, int(2 * r) + 3, int(2 * r) + 3)
+        items["ball"] = (box, ((x, y), r))
+        if pygame.font:
+            width, height = self.screen.get_size()
+            if game.waiting:
+                text = self._text("Press ENTER to start", 128)
+                items["prompt"] = (text.get_rect(centerx=width/2, centery=height/4), text)
+            text = self._text(f"{game.player1.score} - {game.player2.score}", 64)
+            items["score"] = (text.get_rect(centerx=width/2, y=10), text)
+        return items
+
+    def _paint(self, rect, content, area):
+        clip = rect.clip(area)
+        if not clip:
+            return
+        if content is None:
+            self.screen.fill(self.colour, clip)
+        elif isinstance(content, tuple):
+            self.screen.set_clip(clip)
+            pygame.draw.circle(self.screen, self.colour, *content)
+            self.screen.set_clip(None)
+        else:
+            self.screen.blit(content, clip, clip.move(-rect.x, -rect.y))
+
+    def draw(self, game):
+        items = self._items(game)
+        if self.full:
+            dirty = [self.screen.get_rect()]
+        else:
+            changed = []
+            for name in self.items.keys() | items.keys():
+                old, new = self.items.get(name), items.get(name)
+                if old == new:
+                    continue
+                slide = _slide(old[0], new[0]) if name in ("left", "right") and old and new else None
+                if slide is not None:
+                    changed.extend(slide)
+                else:
+                    changed.extend(item[0] for item in (old, new) if item)
+            dirty = _merge(changed)
+        # dirty areas don't overlap and are wiped first, so antialiased text is never blended twice
+        for area in dirty:
+            self.screen.fill(self.background, area)
+
+        for rect, content in items.values():
+            for area in dirty:
+                self._paint(rect, content, area)
+
+        if self.full:
+            pygame.display.flip()
+            self.full = False
+        elif dirty:
+            pygame.display.update(dirty)
+        self.items = items
+
+def _merge(rects):
+    # replaces overlapping rects by their bounding rect until none overlap
+    merged = []
+    for rect in rects:
+        if not rect:
+            continue
+        i = rect.collidelist(merged)
+        while i != -1:
+            rect = rect.union(merged.pop(i))
+            i = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+def _slide(old, new):
+    # (strip uncovered, strip newly covered) when a rect moved straight up or down and still overlaps, else None
+    if old.x != new.x or old.size != new.size or not old.colliderect(new):
+        return None
+    if new.y > old.y:
+        return pygame.Rect(old.x, old.y, old.w, new.y - old.y), pygame.Rect(old.x, old.bottom, old.w, new.bottom - old.bottom)
+    return pygame.Rect(old.x, new.bottom, old.w, old.bottom - new.bottom), pygame.Rect(old.x, new.y, old.w, old.y - new.y)
 
 class Game:
-    def __init__(self, fps=60, init_speed=600, max_speed=3000, max_score=5, friction=1, restitution=15):
-        pygame.init()
-        pygame.display.set_caption("Pong")
+    def __init__(self, fps=60, init_speed=600, max_speed=3000, max_score=5, friction=1, restitution=15, headless=False, seed=None,
+                 render_fps=None):
+        # headless games never touch the display, clock or keyboard; every player needs a controller (see match.py)
+        self.headless = headless
+        if not headless:
+            pygame.init()
+            pygame.display.set_caption("Pong")
         self.fps = fps
+        # draw at most render_fps times a second (default: every update), e.g. to spare a slow machine
+        self.render_fps = render_fps
         self.init_speed = init_speed
         self.max_speed = max_speed
         self.max_score = max_score
@@ -102,73 +225,50 @@ class Game:
         self.restitution = restitution
         self.running = True
         self.waiting = True
-        self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
-        self.clock = pygame.time.Clock()
+        self.screen = None if headless else pygame.display.set_mode((WIDTH, HEIGHT))
+        self.clock = None if headless else pygame.time.Clock()
+        self.renderer = None if headless else Renderer(self.screen)
         self.player1 = Player(WIDTH * 0.1, HEIGHT * 0.5, WIDTH * 0.04, HEIGHT * 0.25, init_speed, pygame.K_w, pygame.K_s)
         self.player2 = Player(WIDTH * 0.9, HEIGHT * 0.5, WIDTH * 0.04, HEIGHT * 0.25, init_speed, pygame.K_PAGEUP, pygame.K_PAGEDOWN)
-        self.ball = Ball(WIDTH/2, HEIGHT/2, WIDTH * 0.02, init_speed, max_speed)
+        self.physics = Physics(self.player1.paddle, self.player2.paddle, WIDTH, HEIGHT, WIDTH * 0.02, max_speed, friction, restitution)
+        self.ball = Ball(self.physics, WIDTH/2, HEIGHT/2, init_speed, random.Random(seed))
+        # per side: None for the keyboard (or a loaded Agent), else a callable (game, side) -> direction
+        self.controllers = [None, None]
+        self.final_score = None
 
     def get_state(self):
-        return np.array([self.player2.rect.y, self.player1.rect.y, self.ball.pos.x - self.player2.rect.x, self.ball.pos.y - self.player2.rect.y, self.ball.vel.x, self.ball.vel.y], dtype=np.float32)
+        ph, right = self.physics, self.player2.paddle
+        return np.array([right.y, self.player1.paddle.y, ph.bx - right.x, ph.by - right.y, ph.vx, ph.vy], dtype=np.float32)
 
-    def draw(self):
-        self.screen.fill("white")
-        pygame.draw.rect(self.screen, "black", self.player1.rect)
-        pygame.draw.rect(self.screen, "black", self.player2.rect)
-        pygame.draw.circle(self.screen, "black", self.ball.pos, self.ball.radius)
+    def get_mirrored_state(self):
+        # the game seen from the left paddle, laid out like get_state() so the same policies can play either side
+        ph, left = self.physics, self.player1.paddle
+        return np.array([left.y, self.player2.paddle.y, (left.x + left.width) - ph.bx, ph.by - left.y, -ph.vx, ph.vy], dtype=np.float32)
 
-        if pygame.font:
-            if self.waiting:
-                font = pygame.font.Font(None, 128)
-                text = font.render("Press ENTER to start", True, "black")
-                pos = text.get_rect(centerx=self.screen.get_width()/2, centery=self.screen.get_height()/4)
-                self.screen.blit(text, pos)
-            # else:
-            font = pygame.font.Font(None, 64)
-            text = font.render(f"{self.player1.score} - {self.player2.score}", True, "black")
-            pos = text.get_rect(centerx=self.screen.get_width()/2, y=10)
-            self.screen.blit(text, pos)
-
-        pygame.display.flip()
+    def draw(self):
+        self.renderer.draw(self)
 
     def check_collisions(self):
-        for player in [self.player1, self.player2]:
-            cx = max(player.rect.left, min(self.ball.pos.x, player.rect.right))
-            cy = max(player.rect.top, min(self.ball.pos.y, player.rect.bottom))
-            
-            dx = self.ball.pos.x - cx
-            dy = self.ball.pos.y - cy
-            
-            if (dx**2 + dy**2) < self.ball.radius**2:
-                if abs(dx) > abs(dy):
-                    v = self.ball.vel.magnitude()
-                    self.ball.vel.x *= -1
-                    self.ball.vel.y += player.velocity * self.friction
-                    self.ball.vel.scale_to_length(min(self.ball.max_speed, v + abs(player.velocity) * self.restitution / player.max_speed))
-                    self.ball.pos.x = cx + (self.ball.radius if dx > 0 else -self.ball.radius)
-                else:
-                    self.ball.vel.y *= -1
-                    self.ball.pos.y = cy + (self.ball.radius if dy > 0 else -self.ball.radius)
-                break
+        self.physics.collide()
 
     def update(self, dt):
-        keys = pygame.key.get_pressed()
-
         # bats
-        players = [self.player1]
-        if self.player2.up != None:
-            players.append(self.player2)
-        for player in players:
-            if keys[player.up]:
-                player.move(dt, -1)
-            if keys[player.down]:
-                player.move(dt, 1)
-            if not keys[player.up] and not keys[player.down]:
-                player.velocity = 0
-
-        if self.player2.up == None:
-            state = self.get_state()
-            self.player2._move(dt, state)
+        keys = None
+        for side, player in enumerate((self.player1, self.player2)):
+            controller = self.controllers[side]
+            if controller is not None:
+                player.move(dt, controller(self, side))
+            elif player.up == None:
+                player._move(dt, self.get_state())
+            else:
+                if keys is None:
+                    keys = pygame.key.get_pressed()
+                if keys[player.up]:
+                    player.move(dt, -1)
+                if keys[player.down]:
+                    player.move(dt, 1)
+                if not keys[player.up] and not keys[player.down]:
+                    player.velocity = 0
 
         # ball
         score = self.ball.move(dt)
@@ -182,6 +282,7 @@ class Game:
             else: # player 2 / agent
                 self.player2.score += 1
             if self.player1.score >= self.max_score or self.player2.score >= self.max_score:
+                self.final_score = (self.player1.score, self.player2.score)
                 self.player1.score = 0
                 self.player2.score = 0
                 return score
@@ -190,6 +291,7 @@ class Game:
         return -1
     
     def run(self):
+        since_draw = 0.0
         while self.running:
             dt = self.clock.tick(self.fps) * 0.001
 
@@ -198,6 +300,8 @@ class Game:
                     self.running = False
                 elif event.type == pygame.KEYDOWN and self.waiting:
                     self.waiting = False
+                elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    self.renderer.invalidate()
             
             if not self.waiting:
                 winner = self.update(dt)
@@ -205,17 +309,27 @@ class Game:
                     print(f"Player {winner + 1} wins!")
                     self.waiting = True
 
-            self.draw()
+            since_draw += dt
+            if self.render_fps is None or since_draw >= 1 / self.render_fps:
+                # keep the remainder so the average rate is render_fps even though updates don't divide it evenly
+                since_draw = 0.0 if self.render_fps is None else since_draw % (1 / self.render_fps)
+                self.draw()
         pygame.quit()
 
-    def load_agent(self, filepath):
+    def load_agent(self, filepath, frame_skip=1):
         if not os.path.exists(filepath):
             print("File doesn't exist")
             return
-        self.player2 = Agent(WIDTH * 0.9, HEIGHT * 0.5, WIDTH * 0.04, HEIGHT * 0.25, self.init_speed)
+        self.player2 = Agent(WIDTH * 0.9, HEIGHT * 0.5, WIDTH * 0.04, HEIGHT * 0.25, self.init_speed, frame_skip)
         self.player2.load(filepath)
+        self.physics.paddles[1] = self.player2.paddle
+
+    def connect_agent(self, address, frame_skip=1):
+        self.player2 = Agent(WIDTH * 0.9, HEIGHT * 0.5, WIDTH * 0.04, HEIGHT * 0.25, self.init_speed, frame_skip)
+        self.player2.connect(address)
+        self.physics.paddles[1] = self.player2.paddle
 
 if __name__ == "__main__":
-    game = Game()
-    game.load_agent("../models/r50_redrew.pth")
-    game.run()
\ No newline at end of file
+    import sys
+    import cli
+    sys.exit(cli.main(["play", *sys.argv[1:]]))
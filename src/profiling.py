@@ -0,0 +1,132 @@
+import cProfile
+import json
+import os
+import time
+from contextlib import nullcontext
+
+"""
+Low-overhead phase timers and counters for the training loop, a JSON-lines
+training log, and optional cProfile / torch.profiler capture windows.
+
+With Timers(enabled=False), phase() hands back one shared null context and
+add()/count() return immediately, so instrumented code costs a method call.
+"""
+
+_NULL = nullcontext()
+
+class _Phase:
+    __slots__ = ("timers", "name", "start")
+
+    def __init__(self, timers, name):
+        self.timers = timers
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.timers.add(self.name, time.perf_counter() - self.start)
+
+class Timers:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.totals = {}
+        self.calls = {}
+        self.counters = {}
+        self.phases = {}
+        self.started = time.perf_counter()
+
+    def phase(self, name):
+        if not self.enabled:
+            return _NULL
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = _Phase(self, name)
+        return phase
+
+    def add(self, name, seconds, calls=1):
+        if not self.enabled:
+            return
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + calls
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self, reset=True):
+        # totals since the last snapshot: seconds and call counts per phase, counters, wall time
+        wall = time.perf_counter() - self.started
+        result = {
+            "wall": wall,
+            "phases": {name: {"seconds": total, "calls": self.calls[name], "fraction": total / wall if wall > 0 else 0.0} for name, total in self.totals.items()},
+            "counters": dict(self.counters),
+        }
+        if reset:
+            self.totals = {}
+            self.calls = {}
+            self.counters = {}
+            self.started = time.perf_counter()
+        return result
+
+class TrainingLog:
+    def __init__(self, path=None, echo=True):
+        self.file = None
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.file = open(path, "a")
+        self.echo = echo
+
+    def write(self, record):
+        if self.file is not None:
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+        if self.echo:
+            print(" ".join(f"{k}={_short(v)}" for k, v in record.items() if not isinstance(v, dict)))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def _short(value):
+    return f"{value:.4g}" if isinstance(value, float) else str(value)
+
+class ProfileWindow:
+    # profiles episodes [start, start + length); kind is "cprofile" or "torch"
+    def __init__(self, kind, start, length, out_dir="profiles"):
+        assert kind in ("cprofile", "torch")
+        self.kind = kind
+        self.start = start
+        self.stop = start + length
+        self.out_dir = out_dir
+        self.profiler = None
+
+    def on_episode(self, episode):
+        if self.profiler is None and self.start <= episode < self.stop:
+            self._begin()
+        elif self.profiler is not None and episode >= self.stop:
+            self.close()
+
+    def _begin(self):
+        if self.kind == "cprofile":
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            import torch
+            self.profiler = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True)
+            self.profiler.__enter__()
+
+    def close(self):
+        if self.profiler is None:
+            return
+        os.makedirs(self.out_dir, exist_ok=True)
+        name = os.path.join(self.out_dir, f"episodes_{self.start}_{self.stop}")
+        if self.kind == "cprofile":
+            self.profiler.disable()
+            self.profiler.dump_stats(name + ".prof")
+        else:
+            self.profiler.__exit__(None, None, None)
+            self.profiler.export_chrome_trace(name + ".json")
+        self.profiler = None
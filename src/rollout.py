@@ -0,0 +1,179 @@
+import multiprocessing as mp
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+import gymnasium as gym
+import numpy as np
+from game import GameEnv
+from inference import NumpyPolicy
+
+"""
+Episode collection across worker processes. Each worker owns a GameEnv and a
+copy of the policy, and writes its trajectory into a shared-memory buffer;
+only the episode length and whether it was cut off by the time limit go
+back over the pipe.
+"""
+
+class TrajectoryBuffer:
+    def __init__(self, max_steps, obs_dims=6, name=None):
+        self.max_steps = max_steps
+        self.obs_dims = obs_dims
+        size = max_steps * (obs_dims * 4 + 4 + 1) + obs_dims * 4
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        offset = 0
+        self.obs = np.ndarray((max_steps, obs_dims), dtype=np.float32, buffer=self.shm.buf, offset=offset)
+        offset += self.obs.nbytes
+        self.rewards = np.ndarray((max_steps,), dtype=np.float32, buffer=self.shm.buf, offset=offset)
+        offset += self.rewards.nbytes
+        self.actions = np.ndarray((max_steps,), dtype=np.int8, buffer=self.shm.buf, offset=offset)
+        offset += self.actions.nbytes
+        # the observation the episode was truncated at, which the learner may bootstrap from
+        self.final = np.ndarray((obs_dims,), dtype=np.float32, buffer=self.shm.buf, offset=offset)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def read(self, length, truncated=False):
+        final = self.final.copy() if truncated else None
+        return self.obs[:length].copy(), self.actions[:length].copy(), self.rewards[:length].copy(), final
+
+    def close(self):
+        del self.obs, self.rewards, self.actions, self.final
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+def _worker(conn, shm_name, max_steps, env_kwargs, worker_seed, timed):
+    rng = np.random.default_rng(worker_seed)
+    buffer = TrajectoryBuffer(max_steps, name=shm_name)
+    env = gym.wrappers.TimeLimit(GameEnv(**env_kwargs), max_episode_steps=max_steps)
+    net = None
+
+    try:
+        while True:
+            cmd, arg = conn.recv()
+            if cmd == "weights":
+                net = NumpyPolicy.from_state_dict(arg)
+            elif cmd == "run":
+                obs, info = env.reset(seed=arg)
+                length = 0
+                done = False
+                sample_time = step_time = 0.0
+                while not done:
+                    buffer.obs[length] = obs
+                    if timed:
+                        t0 = time.perf_counter()
+                        action = net.sample(buffer.obs[length], rng)
+                        t1 = time.perf_counter()
+                        obs, reward, terminated, truncated, info = env.step(action - 1)
+                        t2 = time.perf_counter()
+                        sample_time += t1 - t0
+                        step_time += t2 - t1
+                    else:
+                        action = net.sample(buffer.obs[length], rng)
+                        obs, reward, terminated, truncated, info = env.step(action - 1)
+                    buffer.actions[length] = action
+                    buffer.rewards[length] = reward
+                    length += 1
+
+                    done = terminated or truncated
+                truncated = truncated and not terminated
+                if truncated:
+                    buffer.final[:] = obs
+                conn.send((length, truncated, sample_time, step_time))
+            elif cmd == "get_rng":
+                conn.send(rng.bit_generator.state)
+            elif cmd == "set_rng":
+                rng.bit_generator.state = arg
+            elif cmd == "close":
+                break
+    finally:
+        buffer.close()
+        env.close()
+
+class RolloutPool:
+    def __init__(self, n_workers, max_steps, seed=0, env_kwargs=None, timers=None):
+        # with enabled timers, workers time sample_action and env.step; these are summed over workers, not wall time
+        self.max_steps = max_steps
+        self.timers = timers
+        ctx = mp.get_context("spawn")
+        self.buffers = []
+        self.conns = []
+        self.procs = []
+        for i in range(n_workers):
+            buffer = TrajectoryBuffer(max_steps)
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_worker, args=(child, buffer.name, max_steps, env_kwargs or {}, seed * 1000 + i, timers is not None and timers.enabled), daemon=True)
+            proc.start()
+            child.close()
+            self.buffers.append(buffer)
+            self.conns.append(parent)
+            self.procs.append(proc)
+
+    def set_weights(self, state_dict):
+        state_dict = {k: v.detach().cpu().numpy() for k, v in state_dict.items()}
+        for conn in self.conns:
+            conn.send(("weights", state_dict))
+
+    def get_rng_states(self):
+        for conn in self.conns:
+            conn.send(("get_rng", None))
+        return [conn.recv() for conn in self.conns]
+
+    def set_rng_states(self, states):
+        # a pool resumed with a different worker count keeps fresh streams for the extra workers
+        for conn, state in zip(self.conns, states):
+            conn.send(("set_rng", state))
+
+    def collect(self, n_episodes, seed=None):
+        # episodes are (obs, actions, rewards, final obs); actions are the policy's output index (0-2), one more than
+        # the env direction, and final obs is None unless the episode hit the time limit
+        episodes = []
+        pending = {}
+        idle = list(range(len(self.conns)))
+        started = 0
+
+        while len(episodes) < n_episodes:
+            while idle and started < n_episodes:
+                i = idle.pop()
+                self.conns[i].send(("run", seed))
+                pending[self.conns[i]] = i
+                started += 1
+
+            for conn in wait(list(pending)):
+                i = pending.pop(conn)
+                length, truncated, sample_time, step_time = conn.recv()
+                episodes.append(self.buffers[i].read(length, truncated))
+                if self.timers is not None:
+                    self.timers.add("worker.sample_action", sample_time, length)
+                    self.timers.add("worker.env.step", step_time, length)
+                idle.append(i)
+        return episodes
+
+    def close(self):
+        for conn in self.conns:
+            try:
+                conn.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for proc in self.procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        for buffer in self.buffers:
+            buffer.close()
+            buffer.unlink()
+        for conn in self.conns:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
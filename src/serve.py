@@ -0,0 +1,233 @@
+import asyncio
+import collections
+import os
+import signal
+import socket
+import stat
+import struct
+import numpy as np
+from inference import NumpyPolicy
+
+"""
+Dynamic-batching policy server. One process holds a NumpyPolicy and serves
+any number of games over a local socket: requests from every connection are
+queued, and a single batcher runs them through one forward pass as soon as
+max_batch are waiting, every connected client has a request waiting, or
+max_wait seconds after the first arrived.
+
+The protocol is fixed-size binary. On connecting the server sends in_dim and
+out_dim as two little-endian uint32s; after that every in_dim float32s sent
+is one observation and is answered, in order, with out_dim float32
+probabilities. Clients may send several observations before reading.
+
+The address is a path for a Unix socket or host:port for TCP. Weights are
+swapped between batches, so no request is dropped or answered by a
+half-loaded model: on SIGHUP, when the checkpoint's mtime changes (with
+watch), or by awaiting swap().
+
+    python cli.py serve --model ../models/r50_redrew.npz --address /tmp/ai-pong.sock
+    python cli.py play --server /tmp/ai-pong.sock
+"""
+
+HEADER = struct.Struct("<II")
+
+def _is_tcp(address):
+    return ":" in address
+
+class PolicyServer:
+    def __init__(self, model_path, address, max_batch=256, max_wait=0.002, watch=None):
+        self.model_path = model_path
+        self.address = address
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.watch = watch
+        self.policy = NumpyPolicy.load(model_path)
+        self.mtime = os.path.getmtime(model_path)
+        self.pending = collections.deque()
+        self.stats = {"requests": 0, "batches": 0, "swaps": 0}
+        self.clients = 0
+        self.ready = None
+        self.flush = None
+
+    async def _handle(self, reader, writer):
+        policy = self.policy
+        size = policy.in_dim * 4
+        writer.write(HEADER.pack(policy.in_dim, policy.out_dim))
+        buffer = bytearray()
+        self.clients += 1
+        try:
+            while True:
+                data = await reader.read(1 << 16)
+                if not data:
+                    break
+                buffer += data
+                n = len(buffer) // size
+                for i in range(n):
+                    self.pending.append((writer, bytes(buffer[i * size:(i + 1) * size])))
+                del buffer[:n * size]
+                if self.pending:
+                    self.ready.set()
+                    # no point waiting for more once every client is waiting on an answer
+                    if len(self.pending) >= min(self.max_batch, self.clients):
+                        self.flush.set()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    async def _batcher(self):
+        while True:
+            await self.ready.wait()
+            if not self.flush.is_set():
+                try:
+                    await asyncio.wait_for(self.flush.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+
+            n = min(len(self.pending), self.max_batch)
+            batch = [self.pending.popleft() for _ in range(n)]
+            obs = np.frombuffer(b"".join(data for _, data in batch), dtype="<f4").reshape(n, -1)
+            out = self.policy.probs(obs).astype("<f4", copy=False).tobytes()
+            step = len(out) // n
+            for i, (writer, _) in enumerate(batch):
+                # answers for a client that has gone away are dropped by its closed transport
+                writer.write(out[i * step:(i + 1) * step])
+            self.stats["requests"] += n
+            self.stats["batches"] += 1
+
+            if len(self.pending) < min(self.max_batch, self.clients):
+                self.flush.clear()
+            if not self.pending:
+                self.ready.clear()
+
+    async def swap(self, path=None):
+        # loads off the event loop, then replaces the policy between two batches
+        path = path or self.model_path
+        policy = await asyncio.get_running_loop().run_in_executor(None, NumpyPolicy.load, path)
+        if (policy.in_dim, policy.out_dim) != (self.policy.in_dim, self.policy.out_dim):
+            raise ValueError(f"{path} has shape {policy.in_dim}->{policy.out_dim}, "
+                             f"the served model {self.policy.in_dim}->{self.policy.out_dim}")
+        self.policy = policy
+        self.model_path = path
+        self.stats["swaps"] += 1
+        print(f"Serving {path}")
+
+    async def _swap_quietly(self):
+        try:
+            await self.swap()
+        except Exception as e:
+            # keep serving the old weights, e.g. if the file was caught mid-write
+            print(f"Failed to load {self.model_path}: {e}")
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.watch)
+            try:
+                mtime = os.path.getmtime(self.model_path)
+            except OSError:
+                continue
+            if mtime != self.mtime:
+                self.mtime = mtime
+                await self._swap_quietly()
+
+    async def serve(self):
+        self.ready = asyncio.Event()
+        self.flush = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        if _is_tcp(self.address):
+            host, port = self.address.rsplit(":", 1)
+            server = await asyncio.start_server(self._handle, host, int(port))
+            for sock in server.sockets:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            # only ever remove a stale socket, never some other file at that path
+            if os.path.exists(self.address) and stat.S_ISSOCK(os.stat(self.address).st_mode):
+                os.remove(self.address)
+            server = await asyncio.start_unix_server(self._handle, self.address)
+
+        tasks = [asyncio.create_task(self._batcher())]
+        if self.watch:
+            tasks.append(asyncio.create_task(self._watch()))
+        if hasattr(signal, "SIGHUP"):
+            loop.add_signal_handler(signal.SIGHUP, lambda: tasks.append(asyncio.create_task(self._swap_quietly())))
+        print(f"Serving {self.model_path} on {self.address} (max batch {self.max_batch}, max wait {self.max_wait * 1e3:g}ms)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            if hasattr(signal, "SIGHUP"):
+                loop.remove_signal_handler(signal.SIGHUP)
+            if not _is_tcp(self.address) and os.path.exists(self.address):
+                os.remove(self.address)
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+        print(f"{self.stats['requests']} requests in {self.stats['batches']} batches, {self.stats['swaps']} swaps")
+
+class PolicyClient:
+    # blocking client with NumpyPolicy's probs/sample interface, so it can stand in for one
+    def __init__(self, address, timeout=None):
+        if _is_tcp(address):
+            host, port = address.rsplit(":", 1)
+            self.sock = socket.create_connection((host, int(port)), timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(address)
+        header = bytearray(HEADER.size)
+        self._recv_into(memoryview(header))
+        self.in_dim, self.out_dim = HEADER.unpack(header)
+        self.request = np.empty(self.in_dim, dtype="<f4")
+        self.response = np.empty(self.out_dim, dtype="<f4")
+
+    def _recv_into(self, view):
+        while len(view):
+            n = self.sock.recv_into(view)
+            if n == 0:
+                raise ConnectionError("Policy server closed the connection")
+            view = view[n:]
+
+    def probs(self, obs):
+        # the whole batch is sent before reading, so it's served in as few forward passes as max_batch allows
+        obs = np.ascontiguousarray(obs, dtype="<f4").reshape(-1, self.in_dim)
+        out = np.empty((obs.shape[0], self.out_dim), dtype="<f4")
+        self.sock.sendall(obs)
+        self._recv_into(memoryview(out).cast("B"))
+        return out
+
+    def probs_one(self, obs):
+        # the returned array is reused by the next call
+        self.request[...] = obs
+        self.sock.sendall(self.request)
+        self._recv_into(memoryview(self.response).cast("B"))
+        return self.response
+
+    def sample(self, obs, rng):
+        u = rng.random()
+        probs = self.probs_one(obs).tolist()
+        for i, p in enumerate(probs):
+            u -= p
+            if u < 0:
+                return i
+        return len(probs) - 1
+
+    def sample_batch(self, obs, rng):
+        cdf = np.cumsum(self.probs(obs), axis=-1)
+        u = rng.random((cdf.shape[0], 1), dtype=np.float32)
+        return np.minimum((u >= cdf).sum(axis=-1), self.out_dim - 1)
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,116 @@
+import json
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+"""
+Hyperparameter sweeps with successive halving. Trials are sampled from a
+search space and all trained for min_episodes; the best 1/eta by rolling
+return move up a rung and train on (from their checkpoints) to eta times the
+budget, until max_episodes. Trials run in a bounded process pool.
+
+Everything lives in the sweep directory: trials.json holds the sampled
+configs, results.jsonl one line per finished (trial, rung), and each trial
+has its own checkpoint directory, so rerunning an interrupted sweep skips
+finished rungs and picks unfinished trials up from their last checkpoint.
+
+A search space maps parameter names to a list of choices or to
+{"low": a, "high": b, "log": true/false, "int": true/false}:
+
+    {"lr": {"low": 1e-4, "high": 3e-3, "log": true}, "gamma": [0.95, 0.99],
+     "hidden_dims": [[50, 50], [64, 64]], "restitution": {"low": 5, "high": 30}}
+"""
+
+AGENT_PARAMS = ("lr", "gamma", "T_0", "hidden_dims")
+ENV_PARAMS = ("init_speed", "max_speed", "friction", "restitution")
+
+def sample_config(space, rng):
+    config = {}
+    for name, spec in space.items():
+        if name not in AGENT_PARAMS + ENV_PARAMS:
+            raise ValueError(f"Unknown sweep parameter {name}")
+        if isinstance(spec, list):
+            config[name] = rng.choice(spec)
+        elif spec.get("log"):
+            config[name] = math.exp(rng.uniform(math.log(spec["low"]), math.log(spec["high"])))
+        else:
+            config[name] = rng.uniform(spec["low"], spec["high"])
+        if isinstance(spec, dict) and spec.get("int"):
+            config[name] = round(config[name])
+    return config
+
+def _run_trial(trial_id, config, budget, sweep_dir, seed, max_steps, batch_episodes):
+    import torch
+    from agent import train
+    # one core per trial; the pool provides the parallelism
+    torch.set_num_threads(1)
+    trial_dir = os.path.join(sweep_dir, f"trial_{trial_id:03d}")
+    summary = train(seed, budget, max_steps, 1, batch_episodes, os.path.join(trial_dir, "model.pth"),
+                    log_path=os.path.join(trial_dir, "train.jsonl"), log_every=min(250, budget), timed=False,
+                    env_kwargs={k: v for k, v in config.items() if k in ENV_PARAMS},
+                    agent_kwargs={k: v for k, v in config.items() if k in AGENT_PARAMS},
+                    checkpoint_dir=os.path.join(trial_dir, "checkpoints"), checkpoint_every=budget, keep_checkpoints=1,
+                    resume=True, metrics_path=os.path.join(trial_dir, "metrics.csv"))
+    return summary["mean"]
+
+class Sweep:
+    def __init__(self, sweep_dir, space=None, n_trials=27, min_episodes=100, max_episodes=2700, eta=3, workers=None,
+                 seed=0, max_steps=500, batch_episodes=8):
+        self.sweep_dir = sweep_dir
+        self.min_episodes = min_episodes
+        self.max_episodes = max_episodes
+        self.eta = eta
+        self.workers = workers or os.cpu_count() or 1
+        self.seed = seed
+        self.max_steps = max_steps
+        self.batch_episodes = batch_episodes
+        os.makedirs(sweep_dir, exist_ok=True)
+
+        trials_path = os.path.join(sweep_dir, "trials.json")
+        if os.path.exists(trials_path):
+            with open(trials_path) as f:
+                self.trials = json.load(f)
+        else:
+            if space is None:
+                raise ValueError(f"No trials.json in {sweep_dir}; a search space is needed to start a sweep")
+            rng = random.Random(seed)
+            self.trials = [sample_config(space, rng) for _ in range(n_trials)]
+            with open(trials_path, "w") as f:
+                json.dump(self.trials, f, indent=1)
+
+        self.results_path = os.path.join(sweep_dir, "results.jsonl")
+        self.results = {}
+        if os.path.exists(self.results_path):
+            with open(self.results_path) as f:
+                for line in f:
+                    record = json.loads(line)
+                    self.results[(record["trial"], record["rung"])] = record["score"]
+
+    def budgets(self):
+        budget = self.min_episodes
+        while budget < self.max_episodes:
+            yield budget
+            budget *= self.eta
+        yield self.max_episodes
+
+    def _record(self, trial, rung, budget, score):
+        self.results[(trial, rung)] = score
+        with open(self.results_path, "a") as f:
+            f.write(json.dumps({"trial": trial, "rung": rung, "budget": budget, "score": score, "config": self.trials[trial]}) + "\n")
+
+    def run(self):
+        alive = list(range(len(self.trials)))
+        for rung, budget in enumerate(self.budgets()):
+            todo = [t for t in alive if (t, rung) not in self.results]
+            if todo:
+                print(f"Rung {rung}: {len(todo)} of {len(alive)} trials to {budget} episodes")
+                with ProcessPoolExecutor(min(self.workers, len(todo))) as executor:
+                    futures = {executor.submit(_run_trial, t, self.trials[t], budget, self.sweep_dir, self.seed, self.max_steps, self.batch_episodes): t for t in todo}
+                    for future in as_completed(futures):
+                        self._record(futures[future], rung, budget, future.result())
+
+            ranked = sorted(alive, key=lambda t: self.results[(t, rung)], reverse=True)
+            if budget >= self.max_episodes:
+                return [(t, self.results[(t, rung)], self.trials[t]) for t in ranked]
+            alive = ranked[:max(1, len(ranked) // self.eta)]
@@ -0,0 +1,138 @@
+import json
+import os
+import gymnasium as gym
+import numpy as np
+
+"""
+Append-only columnar episode storage. Each column is a flat binary file
+(obs.bin, actions.bin, rewards.bin, flags.bin) and index.bin holds one
+(start, length, seed) row per finished episode. TrajectoryStore reads them
+back through np.memmap, so episodes are views into the files, not copies.
+
+Row t of an episode is the observation the action was taken from, the
+action, the reward it got and its terminated/truncated flags.
+"""
+
+COLUMNS = {
+    "obs": np.float32,
+    "actions": np.int8,
+    "rewards": np.float32,
+    "flags": np.uint8,
+}
+INDEX_DTYPE = np.dtype([("start", np.int64), ("length", np.int64), ("seed", np.int64)])
+TERMINATED = 1
+TRUNCATED = 2
+
+class TrajectoryRecorder(gym.Wrapper):
+    def __init__(self, env, path):
+        super().__init__(env)
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.obs_dims = int(np.prod(env.observation_space.shape))
+
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                assert json.load(f)["obs_dims"] == self.obs_dims, "store was recorded with a different observation size"
+        else:
+            with open(meta_path, "w") as f:
+                json.dump({"obs_dims": self.obs_dims}, f)
+
+        self.files = {name: open(os.path.join(path, f"{name}.bin"), "ab") for name in COLUMNS}
+        self.index = open(os.path.join(path, "index.bin"), "ab")
+        self.steps = os.path.getsize(os.path.join(path, "actions.bin"))
+        self.start = self.steps
+        self.seed = -1
+        self.last_obs = None
+
+    def reset(self, *, seed=None, options=None):
+        self._end_episode()
+        obs, info = self.env.reset(seed=seed, options=options)
+        self.seed = -1 if seed is None else seed
+        self.last_obs = obs
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        flags = (TERMINATED if terminated else 0) | (TRUNCATED if truncated else 0)
+        self.files["obs"].write(np.asarray(self.last_obs, dtype=np.float32).tobytes())
+        self.files["actions"].write(np.int8(action).tobytes())
+        self.files["rewards"].write(np.float32(reward).tobytes())
+        self.files["flags"].write(np.uint8(flags).tobytes())
+        self.steps += 1
+        self.last_obs = obs
+        if terminated or truncated:
+            self._end_episode()
+        return obs, reward, terminated, truncated, info
+
+    def _end_episode(self):
+        if self.steps > self.start:
+            for f in self.files.values():
+                f.flush()
+            self.index.write(np.array([(self.start, self.steps - self.start, self.seed)], dtype=INDEX_DTYPE).tobytes())
+            self.index.flush()
+        self.start = self.steps
+
+    def close(self):
+        # an unfinished episode is dropped from the index; its rows stay in the columns
+        for f in self.files.values():
+            f.close()
+        self.index.close()
+        super().close()
+
+class TrajectoryStore:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.obs_dims = json.load(f)["obs_dims"]
+        self.refresh()
+
+    def _map(self, name, dtype, shape_tail=()):
+        filepath = os.path.join(self.path, f"{name}.bin")
+        itemsize = np.dtype(dtype).itemsize * int(np.prod(shape_tail))
+        n = os.path.getsize(filepath) // itemsize
+        if n == 0:
+            return np.empty((0, *shape_tail), dtype=dtype)
+        return np.memmap(filepath, dtype=dtype, mode="r", shape=(n, *shape_tail))
+
+    def refresh(self):
+        # re-map the files to pick up episodes recorded since opening
+        self.index = self._map("index", INDEX_DTYPE)
+        self.obs = self._map("obs", np.float32, (self.obs_dims,))
+        self.actions = self._map("actions", np.int8)
+        self.rewards = self._map("rewards", np.float32)
+        self.flags = self._map("flags", np.uint8)
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def steps(self):
+        return len(self.actions)
+
+    def __getitem__(self, i):
+        start, length, seed = self.index[i]
+        s = slice(start, start + length)
+        flags = self.flags[s]
+        return {
+            "obs": self.obs[s],
+            "actions": self.actions[s],
+            "rewards": self.rewards[s],
+            "terminated": (flags & TERMINATED) != 0,
+            "truncated": (flags & TRUNCATED) != 0,
+            "seed": None if seed < 0 else int(seed),
+        }
+
+    def batch(self, episodes):
+        # concatenated rows for several episodes, e.g. for behaviour cloning minibatches
+        rows = np.concatenate([np.arange(start, start + length) for start, length, _ in self.index[episodes]])
+        return self.obs[rows], self.actions[rows], self.rewards[rows]
+
+    def replay(self, i, env):
+        # re-runs episode i in env from its recorded seed and yields each step's result
+        episode = self[i]
+        if episode["seed"] is None:
+            raise ValueError(f"Episode {i} was recorded without a reset seed and can't be replayed")
+        env.reset(seed=episode["seed"])
+        for action in episode["actions"]:
+            yield env.step(int(action))
@@ -0,0 +1,438 @@
+import gymnasium as gym
+import numpy as np
+from gymnasium.vector import AutoresetMode, VectorEnv
+from gymnasium.vector.utils import batch_space
+from game import STATE_DTYPE
+from physics import Paddle, Physics, LEFT_X, RIGHT_X
+
+"""
+Batched version of game.GameEnv. Every game is a row in a set of flat arrays
+and all games advance together in one vectorised pass, reproducing the
+physics.Physics dynamics and GameEnv's rewards at the fixed 16ms tick. By
+default collisions are swept along the ball's path like GameEnv's, so
+evaluation and planning see the physics models are trained and played
+under. That costs roughly 40% of the steps per second on large batches;
+swept=False uses the discrete overlap test of GameEnv(swept=False)
+instead, which is faster but misses and misplaces fast contacts. Finished
+games are reset in the same step; the terminal observation is returned in
+info["final_obs"].
+
+info["score"] is each game's result for the step (1 agent scored, 0 opponent
+scored, -1 neither) and info["hit"] which paddle touched the ball (1 agent,
+0 opponent, -1 none). Setting opponent_actions to an array of directions
+drives the left paddle with them instead of the scripted tracker; see
+opponent_obs() for the mirrored observation an opponent policy expects.
+"""
+
+class VectorPongEnv(VectorEnv):
+    metadata = {"autoreset_mode": AutoresetMode.SAME_STEP}
+    # once this few games still have contacts to resolve in a tick, finish them one at a time with Physics
+    SCALAR_ROWS = 32
+
+    def __init__(self, num_envs, init_speed=600, max_speed=3000, friction=1, restitution=15, max_episode_steps=None, swept=True):
+        self.num_envs = num_envs
+        self.width = 1280
+        self.height = 720
+        self.pad_width = self.width * 0.04
+        self.pad_height = self.height * 0.25
+        self.ball_rad = self.width * 0.02
+        self.init_speed = init_speed
+        self.max_speed = max_speed
+        self.friction = friction
+        self.restitution = restitution
+        self.max_episode_steps = max_episode_steps
+        self.swept = swept
+        self.opponent_actions = None
+
+        self.agent_x = RIGHT_X
+        self.opp_x = LEFT_X
+        self.physics = Physics(Paddle(LEFT_X, 0, self.pad_width, self.pad_height, init_speed),
+                               Paddle(RIGHT_X, 0, self.pad_width, self.pad_height, init_speed),
+                               self.width, self.height, self.ball_rad, max_speed, friction, restitution)
+
+        # game state in float64 like Physics, so GameEnv snapshots carry over exactly and games don't drift from it
+        self.agent_y = np.zeros(num_envs, dtype=np.float64)
+        self.agent_vy = np.zeros(num_envs, dtype=np.float64)
+        self.opp_y = np.zeros(num_envs, dtype=np.float64)
+        self.opp_vy = np.zeros(num_envs, dtype=np.float64)
+        self.ball_pos = np.zeros((num_envs, 2), dtype=np.float64)
+        self.ball_vel = np.zeros((num_envs, 2), dtype=np.float64)
+        self.reward = np.zeros(num_envs, dtype=np.float32)
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+        self.obs = np.zeros((num_envs, 6), dtype=np.float32)
+        self.hit = np.full(num_envs, -1, dtype=np.int8)
+
+        self.single_observation_space = gym.spaces.Box(np.array([0, 0, self.ball_rad - self.agent_x, self.pad_height + self.ball_rad - self.height, -self.max_speed, -self.max_speed]),
+                                                       np.array([self.height - self.pad_height, self.height - self.pad_height, self.width - self.agent_x - self.ball_rad, self.height - self.ball_rad, self.max_speed, self.max_speed]), shape=(6,), dtype=np.float32)
+        self.single_action_space = gym.spaces.Discrete(3)
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+        self.action_space = batch_space(self.single_action_space, num_envs)
+
+    def _get_obs(self):
+        self.obs[:, 0] = self.agent_y
+        self.obs[:, 1] = self.opp_y
+        self.obs[:, 2] = self.ball_pos[:, 0] - self.agent_x
+        self.obs[:, 3] = self.ball_pos[:, 1] - self.agent_y
+        self.obs[:, 4:] = self.ball_vel
+        return self.obs.copy()
+
+    def opponent_obs(self):
+        # the game seen from the left paddle, mirrored so it looks like the agent's view
+        obs = np.empty((self.num_envs, 6), dtype=np.float32)
+        obs[:, 0] = self.opp_y
+        obs[:, 1] = self.agent_y
+        obs[:, 2] = (self.width - self.ball_pos[:, 0]) - (self.width - self.opp_x - self.pad_width)
+        obs[:, 3] = self.ball_pos[:, 1] - self.opp_y
+        obs[:, 4] = -self.ball_vel[:, 0]
+        obs[:, 5] = self.ball_vel[:, 1]
+        return obs
+
+    def _get_info(self):
+        return {"distance": np.hypot(self.obs[:, 2], self.obs[:, 3])}
+
+    def get_state(self):
+        # one game.STATE_DTYPE record per game; the env's RNG is shared by all games, so it isn't included
+        states = np.zeros(self.num_envs, dtype=STATE_DTYPE)
+        states["agent_y"] = self.agent_y
+        states["agent_vy"] = self.agent_vy
+        states["opp_y"] = self.opp_y
+        states["opp_vy"] = self.opp_vy
+        states["ball_pos"] = self.ball_pos
+        states["ball_vel"] = self.ball_vel
+        states["reward"] = self.reward
+        return states
+
+    def set_state(self, states, mask=None):
+        # states holds one record per game, or per True entry of mask; a single record is broadcast
+        rows = slice(None) if mask is None else mask
+        self.agent_y[rows] = states["agent_y"]
+        self.agent_vy[rows] = states["agent_vy"]
+        self.opp_y[rows] = states["opp_y"]
+        self.opp_vy[rows] = states["opp_vy"]
+        self.ball_pos[rows] = states["ball_pos"]
+        self.ball_vel[rows] = states["ball_vel"]
+        self.reward[rows] = states["reward"]
+        self.steps[rows] = 0
+        self._get_obs()
+
+    def _reset_games(self, mask):
+        n = int(np.count_nonzero(mask))
+        if n == 0:
+            return
+        rng = self.np_random
+        self.reward[mask] = 0
+        self.steps[mask] = 0
+        self.agent_vy[mask] = 0
+        self.opp_vy[mask] = 0
+        self.agent_y[mask] = rng.uniform(0, self.height - self.pad_height, size=n)
+        self.opp_y[mask] = rng.uniform(0, self.height - self.pad_height, size=n)
+        self.ball_pos[mask] = rng.uniform([self.opp_x + self.pad_width + self.ball_rad, self.ball_rad], [self.agent_x - self.ball_rad, self.height - self.ball_rad], size=(n, 2))
+        self.ball_vel[mask] = rng.uniform(-self.init_speed, self.init_speed, size=(n, 2))
+
+    def reset(self, *, seed=None, options=None):
+        super().reset(seed=seed)
+        mask = np.ones(self.num_envs, dtype=bool)
+        if options is not None and "reset_mask" in options:
+            mask = options["reset_mask"]
+        self._reset_games(mask)
+        obs = self._get_obs()
+        return obs, self._get_info()
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        result = self.update(dt=0.016, actions=actions)
+        self.steps += 1
+
+        terminated = result != -1
+        if self.max_episode_steps is not None:
+            truncated = ~terminated & (self.steps >= self.max_episode_steps)
+        else:
+            truncated = np.zeros(self.num_envs, dtype=bool)
+        rewards = self.reward.copy()
+        obs = self._get_obs()
+        info = self._get_info()
+        info["score"] = result
+        info["hit"] = self.hit
+
+        done = terminated | truncated
+        if done.any():
+            info["final_obs"] = obs.copy()
+            info["final_info"] = {"distance": info["distance"].copy()}
+            info["_final_obs"] = done
+            self._reset_games(done)
+            obs = self._get_obs()
+            info["distance"] = self._get_info()["distance"]
+        return obs, rewards, terminated, truncated, info
+
+    def check_collisions(self, live):
+        bx = self.ball_pos[:, 0]
+        by = self.ball_pos[:, 1]
+        vx = self.ball_vel[:, 0]
+        vy = self.ball_vel[:, 1]
+        result = np.full(self.num_envs, -1, dtype=np.int8)
+
+        for player, x, y, pvy in ((1, self.agent_x, self.agent_y, self.agent_vy), (0, self.opp_x, self.opp_y, self.opp_vy)):
+            cx = np.clip(bx, x, x + self.pad_width)
+            cy = np.clip(by, y, y + self.pad_height)
+            dx = bx - cx
+            dy = by - cy
+
+            hit = live & (result == -1) & (dx**2 + dy**2 < self.ball_rad**2)
+            if not hit.any():
+                continue
+            if self.swept:
+                # as in Physics.collide, only a paddle that moved into the ball, not an overlap it's already leaving
+                hit[hit] = dx[hit] * vx[hit] + dy[hit] * vy[hit] <= 0
+            side = hit & (np.abs(dx) > np.abs(dy))
+            top = hit & ~side
+
+            if side.any():
+                v = np.hypot(vx[side], vy[side])
+                vx[side] *= -1
+                vy[side] += pvy[side] * self.friction
+                speed = np.minimum(self.max_speed, v + np.abs(pvy[side]) * self.restitution / self.init_speed)
+                norm = np.hypot(vx[side], vy[side])
+                self.ball_vel[side] *= np.where(norm > 0, speed / np.maximum(norm, 1e-12), 1)[:, None]
+                bx[side] = cx[side] + np.where(dx[side] > 0, self.ball_rad, -self.ball_rad)
+                if player == 1:
+                    self.reward[side] += 0.1
+            if top.any():
+                vy[top] *= -1
+                by[top] = cy[top] + np.where(dy[top] > 0, self.ball_rad, -self.ball_rad)
+                if player == 1:
+                    self.reward[top] -= 0.1
+            result[hit] = player
+        return result
+
+    def _move(self, dt, dir, y, vy, mask=None):
+        if mask is None:
+            vy[:] = dir * self.init_speed
+            y += vy * dt
+        else:
+            vy[mask] = dir[mask] * self.init_speed
+            y[mask] += vy[mask] * dt
+        low = y < 0
+        high = y > self.height - self.pad_height
+        y[low] = 0
+        y[high] = self.height - self.pad_height
+        vy[low | high] = 0
+
+    def update(self, dt, actions):
+        # opponent
+        if self.opponent_actions is not None:
+            self._move(dt, np.asarray(self.opponent_actions), self.opp_y, self.opp_vy)
+        else:
+            by = self.ball_pos[:, 1]
+            up = by < self.opp_y
+            down = by > self.opp_y + self.pad_height
+            self._move(dt, down.astype(np.float32) - up, self.opp_y, self.opp_vy, up | down)
+            self.opp_vy[~(up | down)] = 0
+
+        # agent
+        self._move(dt, actions, self.agent_y, self.agent_vy)
+
+        # ball
+        if self.swept:
+            result, hit = self._sweep(dt)
+        else:
+            result = self._move_ball(dt)
+
+        # score
+        self.reward[result == 1] += 1
+        self.reward[result == 0] -= 1
+
+        self.hit = self.check_collisions(result == -1)
+        if self.swept:
+            self.hit = np.where(self.hit != -1, self.hit, hit).astype(np.int8)
+        return result
+
+    def _move_ball(self, dt):
+        self.ball_pos += self.ball_vel * dt
+        by = self.ball_pos[:, 1]
+        vy = self.ball_vel[:, 1]
+        wall = by - self.ball_rad < 0
+        by[wall] = 2 * self.ball_rad - by[wall]
+        vy[wall] *= -1
+        wall = by + self.ball_rad > self.height
+        by[wall] = 2 * self.height - by[wall] - 2 * self.ball_rad
+        vy[wall] *= -1
+
+        bx = self.ball_pos[:, 0]
+        result = np.full(self.num_envs, -1, dtype=np.int8)
+        result[bx - self.ball_rad < 0] = 1
+        result[(result == -1) & (bx + self.ball_rad > self.width)] = 0
+        return result
+
+    def _sweep(self, dt):
+        # Physics._sweep for every game at once. Games whose path this tick stays clear of the walls, goals and paddles'
+        # columns just move; the rest go through passes that each resolve the earliest wall, score or paddle contact
+        # of the games still moving, until each has used up dt. The last few, e.g. a ball wedged against a paddle,
+        # are finished by Physics itself rather than paying a full pass per contact. Returns the results and the last paddle hit, and
+        # rewards the agent's hits of games still in play, as GameEnv.check_collisions does.
+        r = self.ball_rad
+        top, bottom = r, self.height - r
+        left, right = r, self.width - r
+        pos = self.ball_pos
+        vel = self.ball_vel
+        ex = pos[:, 0] + vel[:, 0] * dt
+        ey = pos[:, 1] + vel[:, 1] * dt
+        clear = ((ey >= top) & (ey <= bottom) & (np.minimum(pos[:, 0], ex) > self.opp_x + self.pad_width + r)
+                 & (np.maximum(pos[:, 0], ex) < self.agent_x - r))
+        near = np.flatnonzero(~clear)
+        bx, by, vx, vy = pos[near, 0], pos[near, 1], vel[near, 0], vel[near, 1]
+        pos[:, 0] = ex
+        pos[:, 1] = ey
+        result = np.full(self.num_envs, -1, dtype=np.int8)
+        hit = np.full(self.num_envs, -1, dtype=np.int8)
+        if not len(near):
+            return result, hit
+
+        paddles = ((0, self.opp_x, self.opp_y[near], self.opp_vy[near]), (1, self.agent_x, self.agent_y[near], self.agent_vy[near]))
+        remaining = np.full(len(near), float(dt))
+        outcome = np.full(len(near), -1, dtype=np.int8)
+        last = np.full(len(near), -1, dtype=np.int8)
+        bonus = np.zeros(len(near))
+        moving = np.arange(len(near))
+
+        for contacts in range(Physics.MAX_CONTACTS):
+            x, y, u, w, t = bx[moving], by[moving], vx[moving], vy[moving], remaining[moving]
+
+            # games whose path stays clear of the walls, goals and both paddles just move
+            ex = x + u * t
+            ey = y + w * t
+            clear = (ey >= top) & (ey <= bottom) & (ex > left) & (ex < right)
+            for _, px, py, _ in paddles:
+                py = py[moving]
+                clear &= ((np.maximum(x, ex) < px - r) | (np.minimum(x, ex) > px + self.pad_width + r)
+                          | (np.maximum(y, ey) < py - r) | (np.minimum(y, ey) > py + self.pad_height + r))
+            if clear.any():
+                bx[moving[clear]] = ex[clear]
+                by[moving[clear]] = ey[clear]
+                moving = moving[~clear]
+            if len(moving) <= self.SCALAR_ROWS:
+                self._finish_sweep(near[moving], moving, bx, by, vx, vy, remaining, outcome, last, bonus, Physics.MAX_CONTACTS - contacts)
+                break
+            if clear.any():
+                x, y, u, w, t = bx[moving], by[moving], vx[moving], vy[moving], remaining[moving]
+
+            # earliest event: kind 0 wall, 1 score, 2 paddle
+            kind = np.full(len(moving), -1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                tw = np.where(w < 0, (top - y) / w, np.where(w > 0, (bottom - y) / w, np.inf))
+                ts = np.where(u < 0, (left - x) / u, np.where(u > 0, (right - x) / u, np.inf))
+            event = tw < t
+            t = np.where(event, np.maximum(tw, 0), t)
+            kind[event] = 0
+            event = ts <= t
+            t = np.where(event, np.maximum(ts, 0), t)
+            kind[event] = 1
+            paddle = np.full(len(moving), -1)
+            nx = np.zeros(len(moving))
+            ny = np.zeros(len(moving))
+            for side, px, py, _ in paddles:
+                tc, cx, cy = _times_of_impact(x, y, u, w, r, px, py[moving], self.pad_width, self.pad_height, t)
+                # a glancing corner bounce can leave the ball grazing the paddle it just left
+                event = (tc < t) & ((tc > 0) | (last[moving] != side))
+                t = np.where(event, tc, t)
+                kind[event] = 2
+                paddle[event] = side
+                nx[event] = cx[event]
+                ny[event] = cy[event]
+
+            bx[moving] = x + u * t
+            by[moving] = y + w * t
+            remaining[moving] -= t
+
+            scored = kind == 1
+            outcome[moving[scored]] = np.where(u[scored] < 0, 1, 0)
+            wall = kind == 0
+            vy[moving[wall]] = -w[wall]
+            bounced = kind == 2
+            if bounced.any():
+                rows = moving[bounced]
+                side = paddle[bounced]
+                pvy = np.where(side == 1, paddles[1][3][rows], paddles[0][3][rows])
+                vx[rows], vy[rows], face = self._bounce(u[bounced], w[bounced], nx[bounced], ny[bounced], pvy)
+                last[rows] = side
+                bonus[rows] += np.where(side == 1, np.where(face, 0.1, -0.1), 0)
+            moving = moving[wall | bounced]
+        else:
+            # out of contacts: finish the step without resolving any more
+            bx[moving] += vx[moving] * remaining[moving]
+            by[moving] = np.clip(by[moving] + vy[moving] * remaining[moving], top, bottom)
+            outcome[moving[bx[moving] < left]] = 1
+            outcome[moving[bx[moving] > right]] = 0
+
+        pos[near, 0] = bx
+        pos[near, 1] = by
+        vel[near, 0] = vx
+        vel[near, 1] = vy
+        result[near] = outcome
+        hit[near] = last
+        self.reward[near] += np.where(outcome == -1, bonus, 0).astype(np.float32)
+        return result, hit
+
+    def _finish_sweep(self, rows, moving, bx, by, vx, vy, remaining, outcome, last, bonus, contacts):
+        ph = self.physics
+        opp, agent = ph.paddles
+        for row, i in zip(rows.tolist(), moving.tolist()):
+            opp.y, opp.vy = float(self.opp_y[row]), float(self.opp_vy[row])
+            agent.y, agent.vy = float(self.agent_y[row]), float(self.agent_vy[row])
+            ph.bx, ph.by, ph.vx, ph.vy = float(bx[i]), float(by[i]), float(vx[i]), float(vy[i])
+            ph.hits.clear()
+            outcome[i] = ph._sweep(float(remaining[i]), int(last[i]), contacts)
+            bx[i], by[i], vx[i], vy[i] = ph.bx, ph.by, ph.vx, ph.vy
+            for side, face in ph.hits:
+                last[i] = side
+                if side == 1:
+                    bonus[i] += 0.1 if face else -0.1
+
+    def _bounce(self, vx, vy, nx, ny, pvy):
+        # Physics._bounce: reflect about the contact normal, picking up the paddle's motion and speed on its face
+        d = vx * nx + vy * ny
+        rx = vx - 2 * d * nx
+        ry = vy - 2 * d * ny
+        face = np.abs(nx) > np.abs(ny)
+        ry = np.where(face, ry + pvy * self.friction, ry)
+        speed = np.minimum(self.max_speed, np.hypot(vx, vy) + np.abs(pvy) * self.restitution / self.init_speed)
+        norm = np.hypot(rx, ry)
+        scale = np.where(face & (norm > 0), speed / np.maximum(norm, 1e-12), 1)
+        return rx * scale, ry * scale, face
+
+def _times_of_impact(bx, by, vx, vy, r, x0, y0, width, height, limit):
+    # physics._time_of_impact for many balls against one paddle each: the time of first contact before limit
+    # (inf where there's none) and the contact normal
+    x1 = x0 + width
+    y1 = y0 + height
+    best = np.full(len(bx), np.inf)
+    nx = np.zeros(len(bx))
+    ny = np.zeros(len(bx))
+    limit = limit.copy()
+
+    def take(event, t, cx, cy):
+        event &= t < limit
+        best[event] = limit[event] = t[event]
+        nx[event] = cx if np.isscalar(cx) else cx[event]
+        ny[event] = cy if np.isscalar(cy) else cy[event]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (x0 - r - bx) / vx
+        take((vx > 0) & (bx <= x0 - r) & (y0 <= by + vy * t) & (by + vy * t <= y1), t, -1.0, 0.0)
+        t = (x1 + r - bx) / vx
+        take((vx < 0) & (bx >= x1 + r) & (y0 <= by + vy * t) & (by + vy * t <= y1), t, 1.0, 0.0)
+        t = (y0 - r - by) / vy
+        take((vy > 0) & (by <= y0 - r) & (x0 <= bx + vx * t) & (bx + vx * t <= x1), t, 0.0, -1.0)
+        t = (y1 + r - by) / vy
+        take((vy < 0) & (by >= y1 + r) & (x0 <= bx + vx * t) & (bx + vx * t <= x1), t, 0.0, 1.0)
+
+        a = vx * vx + vy * vy
+        for cx, cy in ((x0, y0), (x1, y0), (x0, y1), (x1, y1)):
+            dx = bx - cx
+            dy = by - cy
+            b = dx * vx + dy * vy
+            c = dx * dx + dy * dy - r * r
+            disc = b * b - a * c
+            # only a ball outside the circle and heading into it
+            t = (-b - np.sqrt(np.maximum(disc, 0))) / a
+            take((a > 0) & (b < 0) & (c >= 0) & (disc >= 0), t, (dx + vx * t) / r, (dy + vy * t) / r)
+    return best, nx, ny